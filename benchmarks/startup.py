@@ -0,0 +1,57 @@
+# Sync Player
+# Copyright (C) 2023, Roman Arsenikhin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measures time from process start to the moment first frames of both videos are shown.
+# Usage (from the project folder): PYTHONPATH=. python benchmarks/startup.py a.mp4 b.mp4
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+MARKER = 'FIRST_FRAMES_SHOWN'
+
+
+def run_once(files) -> float:
+    start = time.time()
+    process = subprocess.Popen([sys.executable, '-m', 'syncvideoplayer.main', '--startup-benchmark'] + files,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    shown = None
+    for line in process.stdout:
+        if line.startswith(MARKER):
+            shown = float(line.split()[1])
+    process.wait()
+    if shown is None:
+        raise RuntimeError('Player exited without showing the videos, exit code %d' % process.returncode)
+    return shown - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files', nargs=2)
+    parser.add_argument('-n', '--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    results = []
+    for idx in range(args.runs):
+        elapsed = run_once(args.files)
+        results.append(elapsed)
+        print('run %d: %.3fs' % (idx + 1, elapsed))
+    print('min %.3fs, median %.3fs, max %.3fs' % (min(results), statistics.median(results), max(results)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# Sync Player
+# Copyright (C) 2023, Roman Arsenikhin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Optional, List
+
+logger = logging.getLogger(__name__)
+
+# used when cache can't be written next to the video file
+USER_CACHE_DIR = Path.home() / '.cache' / 'syncvideoplayer'
+
+
+def _file_stamp(fname: str) -> dict:
+    st = os.stat(fname)
+    return {'size': st.st_size, 'mtime': int(st.st_mtime)}
+
+
+def _cache_paths(fname: str, kind: str) -> List[Path]:
+    """
+    Returns possible cache file locations, in order of preference
+    :param fname: video file
+    :param kind: type of cached data
+    """
+    path = Path(fname).resolve()
+    alongside = path.with_name('.%s.%s.json' % (path.name, kind))
+    digest = hashlib.sha1(str(path).encode('utf-8')).hexdigest()
+    in_user_dir = USER_CACHE_DIR / ('%s.%s.json' % (digest, kind))
+    return [alongside, in_user_dir]
+
+
+def load_cached(fname: str, kind: str) -> Optional[dict]:
+    """
+    Loads data cached for the video file. Cache is ignored if the file was changed since the data was stored.
+    :param fname: video file
+    :param kind: type of cached data
+    :return: cached data or None
+    """
+    try:
+        stamp = _file_stamp(fname)
+    except OSError:
+        return None
+    for cache_path in _cache_paths(fname, kind):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if record.get('stamp') == stamp:
+            return record.get('data')
+    return None
+
+
+def store_cached(fname: str, kind: str, data: dict):
+    """
+    Stores data for the video file, next to the file if possible, otherwise in user cache directory
+    :param fname: video file
+    :param kind: type of cached data
+    :param data: JSON-serializable data
+    """
+    try:
+        record = {'stamp': _file_stamp(fname), 'data': data}
+    except OSError:
+        return
+    for cache_path in _cache_paths(fname, kind):
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(cache_path, 'w', encoding='utf-8') as f:
+                json.dump(record, f)
+            return
+        except OSError:
+            logger.debug('Unable to write cache %s', cache_path)
+    logger.warning('Unable to cache %s for %s', kind, fname)
@@ -0,0 +1,200 @@
+# Sync Player
+# Copyright (C) 2023, Roman Arsenikhin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# The module doesn't depend on Qt, so it can be imported by worker processes
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from typing import List, Callable, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# frames of both videos are scaled to the same size before comparison
+COMPARE_WIDTH = 640
+COMPARE_HEIGHT = 360
+# ITU-R BT.601 luma weights for BGR0 frames returned by mpv
+LUMA_WEIGHTS_BGR = np.array([0.114, 0.587, 0.299], dtype=np.float32)
+SSIM_WINDOW = 8
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+# reported for identical frames
+PSNR_MAX = 100.0
+# minimum number of frames processed by one worker task
+MIN_CHUNK_SIZE = 25
+# how long a worker waits for a file to be loaded or a frame to be decoded after seek, s
+LOAD_TIMEOUT = 30
+SEEK_TIMEOUT = 10
+# how often the comparison checks for cancellation, s
+CANCEL_POLL_INTERVAL = 0.2
+
+# set in worker processes, tells the tasks to stop
+_worker_cancel_event = None
+
+
+@dataclass
+class CompareResult:
+    times: np.ndarray
+    psnr: np.ndarray
+    ssim: np.ndarray
+    absdiff: np.ndarray
+
+
+def frame_to_luma(data: bytes, width: int, height: int, stride: int) -> np.ndarray:
+    """
+    Converts raw BGR0 frame to luma plane. Frame buffer is not copied, only the luma plane is allocated.
+    :return: float32 array of shape (height, width)
+    """
+    pixels = np.frombuffer(data, dtype=np.uint8).reshape(height, stride)[:, :width * 4].reshape(height, width, 4)
+    return pixels[..., :3] @ LUMA_WEIGHTS_BGR
+
+
+def _box_mean(x: np.ndarray, size: int) -> np.ndarray:
+    """
+    Mean over all size x size windows (valid region only), computed with integral image
+    """
+    integral = np.pad(x, ((1, 0), (1, 0))).cumsum(axis=0, dtype=np.float64).cumsum(axis=1)
+    sums = integral[size:, size:] - integral[:-size, size:] - integral[size:, :-size] + integral[:-size, :-size]
+    return sums / (size * size)
+
+
+def psnr(a: np.ndarray, b: np.ndarray) -> float:
+    mse = float(np.mean(np.square(a - b)))
+    if mse == 0:
+        return PSNR_MAX
+    return min(PSNR_MAX, 10.0 * np.log10(255.0 ** 2 / mse))
+
+
+def ssim(a: np.ndarray, b: np.ndarray) -> float:
+    mu_a = _box_mean(a, SSIM_WINDOW)
+    mu_b = _box_mean(b, SSIM_WINDOW)
+    var_a = _box_mean(a * a, SSIM_WINDOW) - mu_a * mu_a
+    var_b = _box_mean(b * b, SSIM_WINDOW) - mu_b * mu_b
+    cov = _box_mean(a * b, SSIM_WINDOW) - mu_a * mu_b
+    ssim_map = ((2 * mu_a * mu_b + SSIM_C1) * (2 * cov + SSIM_C2)) / \
+               ((mu_a * mu_a + mu_b * mu_b + SSIM_C1) * (var_a + var_b + SSIM_C2))
+    return float(ssim_map.mean())
+
+
+def absdiff(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean(np.abs(a - b)))
+
+
+def _create_player(fname: str):
+    from mpv import MPV
+
+    player = MPV(vo='null', audio=False, hwdec='no', config=False, input_default_bindings=False, keep_open=True,
+                 loglevel='error', pause=True, hr_seek_framedrop=False,
+                 vf='lavfi-scale=w=%d:h=%d' % (COMPARE_WIDTH, COMPARE_HEIGHT))
+    try:
+        with player.prepare_and_wait_for_event('playback-restart', timeout=LOAD_TIMEOUT):
+            player.play(fname)
+    except Exception:
+        player.terminate()
+        raise
+    return player
+
+
+def _grab_luma(player, time_ms: int) -> np.ndarray:
+    with player.prepare_and_wait_for_event('playback-restart', timeout=SEEK_TIMEOUT):
+        player.seek(max(0.0, time_ms / 1000.0), reference='absolute', precision='exact')
+    frame = player.node_command('screenshot-raw', 'video')
+    return frame_to_luma(frame['data'], frame['w'], frame['h'], frame['stride'])
+
+
+def compare_chunk(files: List[str], offsets: List[int], times: List[int]) -> List[Tuple[int, float, float, float]]:
+    """
+    Compares frames of two videos at given global times. Executed in worker process.
+    :param files: two video files
+    :param offsets: offsets of the videos relative to the global time
+    :param times: global times of the frames to compare
+    :return: list of (time, psnr, ssim, absdiff)
+    """
+    players = []
+    try:
+        for fname in files:
+            players.append(_create_player(fname))
+        result = []
+        for time_ms in times:
+            if _worker_cancel_event is not None and _worker_cancel_event.is_set():
+                break
+            a, b = [_grab_luma(player, time_ms + offset) for player, offset in zip(players, offsets)]
+            result.append((time_ms, psnr(a, b), ssim(a, b), absdiff(a, b)))
+        return result
+    finally:
+        for player in players:
+            player.terminate()
+
+
+def _init_worker(cancel_event):
+    global _worker_cancel_event
+    _worker_cancel_event = cancel_event
+
+
+def run_comparison(files: List[str], offsets: List[int], start: int, end: int, step: int,
+                   workers: Optional[int] = None,
+                   progress: Optional[Callable[[int, int], None]] = None,
+                   cancel: Optional[threading.Event] = None) -> Optional[CompareResult]:
+    """
+    Compares two videos over the range of global time, distributing the work over the process pool.
+    If a chunk fails, the remaining chunks are stopped and the error is raised.
+    :param files: two video files
+    :param offsets: offsets of the videos relative to the global time
+    :param start: start of the range, ms
+    :param end: end of the range, ms
+    :param step: step between compared frames, ms
+    :param workers: number of worker processes, by default number of CPUs
+    :param progress: called with (done frames, total frames)
+    :param cancel: when set, the comparison is stopped
+    :return: result or None if the comparison was cancelled
+    """
+    times = list(range(start, end + 1, step))
+    workers = workers or os.cpu_count() or 1
+    chunk_size = max(MIN_CHUNK_SIZE, -(-len(times) // workers))
+    chunks = [times[i:i + chunk_size] for i in range(0, len(times), chunk_size)]
+    logger.info('Comparing %d frames in %d chunks', len(times), len(chunks))
+
+    rows = []
+    # players and Qt are running in this process, so it must not be forked
+    context = multiprocessing.get_context('spawn')
+    worker_cancel_event = context.Event()
+    # running tasks stop after the current frame, so leaving the block doesn't wait for the whole chunks
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks) or 1), mp_context=context,
+                             initializer=_init_worker, initargs=(worker_cancel_event,)) as executor:
+        pending = {executor.submit(compare_chunk, files, offsets, chunk) for chunk in chunks}
+        try:
+            while pending:
+                if cancel is not None and cancel.is_set():
+                    logger.info('Comparison cancelled')
+                    return None
+                done, pending = wait(pending, timeout=CANCEL_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    rows.extend(future.result())
+                if done and progress is not None:
+                    progress(len(rows), len(times))
+        finally:
+            if pending:
+                worker_cancel_event.set()
+                for future in pending:
+                    future.cancel()
+
+    rows.sort()
+    data = np.array(rows, dtype=np.float64).reshape(-1, 4)
+    return CompareResult(times=data[:, 0].astype(np.int64), psnr=data[:, 1], ssim=data[:, 2], absdiff=data[:, 3])
@@ -0,0 +1,204 @@
+# Sync Player
+# Copyright (C) 2023, Roman Arsenikhin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import threading
+from typing import List, Optional
+
+from PySide6.QtCore import Signal, QPointF
+from PySide6.QtGui import QPainter, QColor, QPolygonF, QMouseEvent
+from PySide6.QtWidgets import QDialog, QVBoxLayout, QWidget, QDoubleSpinBox, QLabel, QPushButton, QComboBox, \
+    QProgressBar, QSizePolicy, QApplication
+
+from syncvideoplayer.utils import ms_to_str_full
+from syncvideoplayer.widgets import HLayoutWidget
+
+logger = logging.getLogger(__name__)
+
+CURVE_COLOR = QColor(42, 130, 218)
+CURSOR_COLOR = QColor(200, 200, 200)
+METRICS = [('SSIM', 'ssim'), ('PSNR, dB', 'psnr'), ('Abs. difference', 'absdiff')]
+
+
+class CurveWidget(QWidget):
+    """
+    Displays per-frame metric, click on the curve emits time of the frame
+    """
+    clicked = Signal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setMinimumHeight(150)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self._times = None
+        self._values = None
+        self._cursor: Optional[int] = None
+
+    def set_curve(self, times, values):
+        self._times = times
+        self._values = values
+        self.update()
+
+    def __time_at(self, x: float) -> Optional[int]:
+        if self._times is None or len(self._times) == 0:
+            return None
+        idx = round(x / max(1, self.width() - 1) * (len(self._times) - 1))
+        return int(self._times[min(len(self._times) - 1, max(0, idx))])
+
+    def mousePressEvent(self, event: QMouseEvent):
+        time_ms = self.__time_at(event.position().x())
+        if time_ms is not None:
+            self._cursor = time_ms
+            self.update()
+            self.clicked.emit(time_ms)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(25, 25, 25))
+        if self._values is None or len(self._values) < 2:
+            return
+        low = float(self._values.min())
+        high = float(self._values.max())
+        scale = (self.height() - 1) / (high - low) if high > low else 0
+        x_step = (self.width() - 1) / (len(self._values) - 1)
+        polygon = QPolygonF([QPointF(idx * x_step, self.height() - 1 - (value - low) * scale)
+                             for idx, value in enumerate(self._values)])
+        painter.setPen(CURVE_COLOR)
+        painter.drawPolyline(polygon)
+        painter.setPen(CURSOR_COLOR)
+        painter.drawText(4, 14, '%.3f' % high)
+        painter.drawText(4, self.height() - 4, '%.3f' % low)
+        if self._cursor is not None:
+            span = self._times[-1] - self._times[0]
+            x = (self._cursor - self._times[0]) / span * (self.width() - 1) if span else 0
+            painter.drawLine(int(x), 0, int(x), self.height())
+
+
+class CompareDialog(QDialog):
+    """
+    Compares frames of two synchronized videos over the range of global time
+    """
+    seek = Signal(int)
+    _progress = Signal(int, int)
+    _finished = Signal(object)
+
+    def __init__(self, files: List[str], offsets: List[int], start: int, end: int, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('Compare videos')
+        self.resize(800, 400)
+        self._files = files
+        self._offsets = offsets
+        self._result = None
+        # set when the dialog or the application is closed, stops the running comparison
+        self._cancel = threading.Event()
+
+        self._layout = QVBoxLayout()
+        self.setLayout(self._layout)
+
+        self._w_settings = HLayoutWidget()
+        self._w_start = self.__make_spinbox(start / 1000.0, end / 1000.0)
+        self._w_end = self.__make_spinbox(end / 1000.0, end / 1000.0)
+        self._w_step = self.__make_spinbox(0.2, 10.0)
+        self._w_step.setMinimum(0.01)
+        self._w_metric = QComboBox()
+        for title, _ in METRICS:
+            self._w_metric.addItem(title)
+        self._w_btn_run = QPushButton('Run')
+        for widget in [QLabel('From, s'), self._w_start, QLabel('To, s'), self._w_end, QLabel('Step, s'),
+                       self._w_step, self._w_metric, self._w_btn_run]:
+            self._w_settings.add_widget(widget)
+
+        self._w_progress = QProgressBar()
+        self._w_curve = CurveWidget()
+        self._w_label = QLabel()
+
+        self._layout.addWidget(self._w_settings)
+        self._layout.addWidget(self._w_progress)
+        self._layout.addWidget(self._w_curve)
+        self._layout.addWidget(self._w_label)
+
+        self._w_btn_run.clicked.connect(self.__on_run)
+        self._w_metric.currentIndexChanged.connect(self.__update_curve)
+        self._w_curve.clicked.connect(self.__on_curve_clicked)
+        self._progress.connect(self.__on_progress)
+        self._finished.connect(self.__on_finished)
+        QApplication.instance().aboutToQuit.connect(self.cancel)
+
+    @staticmethod
+    def __make_spinbox(value: float, maximum: float) -> QDoubleSpinBox:
+        spinbox = QDoubleSpinBox()
+        spinbox.setDecimals(3)
+        spinbox.setRange(0, maximum)
+        spinbox.setValue(value)
+        return spinbox
+
+    def __on_run(self):
+        start = int(self._w_start.value() * 1000)
+        end = int(self._w_end.value() * 1000)
+        step = max(1, int(self._w_step.value() * 1000))
+        if end < start:
+            return
+        self._w_btn_run.setEnabled(False)
+        self._w_progress.setValue(0)
+        self._cancel.clear()
+        threading.Thread(target=self.__run, args=(start, end, step), daemon=True).start()
+
+    def __run(self, start: int, end: int, step: int):
+        from syncvideoplayer.compare import run_comparison
+
+        try:
+            result = run_comparison(self._files, self._offsets, start, end, step,
+                                    progress=lambda done, total: self._progress.emit(done, total),
+                                    cancel=self._cancel)
+        except Exception as e:
+            logger.exception('Comparison failed')
+            result = e
+        if result is not None:
+            self._finished.emit(result)
+
+    def cancel(self):
+        """
+        Stops the running comparison, worker processes are stopped after the current frame
+        """
+        self._cancel.set()
+
+    def done(self, result: int):
+        self.cancel()
+        self._w_btn_run.setEnabled(True)
+        super().done(result)
+
+    def __on_progress(self, done: int, total: int):
+        self._w_progress.setRange(0, total)
+        self._w_progress.setValue(done)
+
+    def __on_finished(self, result):
+        self._w_btn_run.setEnabled(True)
+        if isinstance(result, Exception):
+            self._w_label.setText('Comparison failed: %s' % str(result))
+            return
+        self._result = result
+        self.__update_curve()
+
+    def __update_curve(self):
+        if self._result is None:
+            return
+        values = getattr(self._result, METRICS[self._w_metric.currentIndex()][1])
+        self._w_curve.set_curve(self._result.times, values)
+        self._w_label.setText('%d frames, mean %.3f, min %.3f' % (len(values), values.mean(), values.min())
+                              if len(values) else 'No frames compared')
+
+    def __on_curve_clicked(self, time_ms: int):
+        self._w_label.setText('Frame at %s' % ms_to_str_full(time_ms))
+        self.seek.emit(time_ms)
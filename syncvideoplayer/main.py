@@ -13,31 +13,51 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import argparse
 import logging
+import multiprocessing
 import os
+import sys
+import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Optional, List, TYPE_CHECKING
 
-import PySide6
-from PySide6.QtCore import Qt, Signal
-from PySide6.QtGui import QIcon, QShortcut, QKeySequence
+from PySide6.QtCore import Qt, Signal, QEvent, QTimer
+from PySide6.QtGui import QIcon, QShortcut, QKeySequence, QCloseEvent
 from PySide6.QtWidgets import QMainWindow, QApplication, QWidget, QVBoxLayout, QFileDialog, QPushButton, QSlider, \
-    QLabel, QMessageBox
+    QLabel, QMessageBox, QMenu
 
 from syncvideoplayer.darkpalette import dark_palette
+from syncvideoplayer.timeline import Timeline
+from syncvideoplayer.tracing import tracer
 from syncvideoplayer.utils import ms_to_str_full, ms_to_str
-from syncvideoplayer.videopanel import VideoPanel
+from syncvideoplayer.videopanel import VideoPanel, find_event
+from syncvideoplayer.videowidget import player_pool, use_player_processes
 from syncvideoplayer.widgets import HLayoutWidget, VLayoutWidget
 
+if TYPE_CHECKING:
+    from syncvideoplayer.reviewqueue import ReviewQueue, QueueEntry
+
 logger = logging.getLogger(__name__)
 
 
 ANCHOR_OVERLAY = 1
 
+PANELS_COUNT = 2
+
 # more or less one frame
 EDGE_ANCHOR_DELTA = 30
 
+# controls are enabled even if realignment seeks didn't finish in time
+ARRANGE_TIMEOUT = 3000
+ARRANGE_STATUS_TIMEOUT = 5000
+
+ZOOM_STEP = 2 ** 0.25
+ZOOM_MAX = 8.0
+# pan step as a part of the visible region
+PAN_STEP = 0.25
+
 ABOUT_TEXT = r"""
 <center><b>Sync Video Player</b></center>
 <center>Version 0.1 (internal build, do not distribute)</center>
@@ -59,13 +79,16 @@ The logo is generated using Stable Diffusion.
 
 
 class PlayerControl(VLayoutWidget):
-    SPEED_VALUES = [25, 50, 75, 100, 125]
+    SPEED_VALUES = [25, 50, 75, 100, 125, 200, 400, 800, 1600]
+    # speeds starting from this one are played in scan mode (key frames only)
+    SCAN_SPEED_MIN = 200
 
     play_clicked = Signal()
     seek = Signal(int)
     anchor_clicked = Signal(bool)
     return_to_anchor_clicked = Signal()
     about_clicked = Signal()
+    compare_clicked = Signal()
     speed_changed = Signal(float)
 
     def __init__(self):
@@ -77,9 +100,7 @@ class PlayerControl(VLayoutWidget):
 
         # basic controls
         self._w_btn_play = QPushButton('Play')
-        self._w_position = QSlider(Qt.Orientation.Horizontal)
-        self._w_position.setTickPosition(QSlider.TickPosition.TicksAbove)
-        self._w_position.setTickInterval(1000)
+        self._w_position = Timeline()
         self._w_label_pos = QLabel()
 
         self._w_line1.add_widget(self._w_btn_play)
@@ -92,7 +113,7 @@ class PlayerControl(VLayoutWidget):
         self._w_speed.setTickInterval(1)
         self._w_speed.setRange(0, len(self.SPEED_VALUES)-1)
         self._w_speed.setPageStep(1)
-        self._w_speed.setMaximumWidth(80)
+        self._w_speed.setMaximumWidth(140)
         self._w_speed_label = QLabel()
 
         # Not yet implemented
@@ -104,6 +125,7 @@ class PlayerControl(VLayoutWidget):
         self._w_btn_set_anchor.setCheckable(True)
         self._w_btn_return_to_anchor = QPushButton('⚓ <-')
         self._w_btn_return_to_anchor.setEnabled(False)
+        self._w_btn_compare = QPushButton('Compare')
         self._w_btn_about = QPushButton('About')
 
         self._w_line2.add_widget(self._w_btn_set_anchor)
@@ -114,6 +136,7 @@ class PlayerControl(VLayoutWidget):
         # self._w_line2.add_widget(self._w_btn_set_b)
         self._w_line2.add_widget(self._w_speed)
         self._w_line2.add_widget(self._w_speed_label)
+        self._w_line2.add_widget(self._w_btn_compare)
         self._w_line2.add_widget(self._w_btn_about)
 
         self.add_widget(self._w_line1)
@@ -123,6 +146,7 @@ class PlayerControl(VLayoutWidget):
         self._w_position.valueChanged.connect(self.__on_slider_moved)
         self._w_btn_set_anchor.clicked.connect(self.__on_anchor_clicked)
         self._w_btn_return_to_anchor.clicked.connect(self.return_to_anchor_clicked)
+        self._w_btn_compare.clicked.connect(self.compare_clicked)
         self._w_btn_about.clicked.connect(self.about_clicked)
         self._w_speed.valueChanged.connect(self.__on_speed_changed)
 
@@ -134,6 +158,12 @@ class PlayerControl(VLayoutWidget):
     def set_length(self, length_ms: int):
         self._w_position.setRange(0, length_ms)
 
+    def get_length(self) -> int:
+        return self._w_position.maximum()
+
+    def set_anchor(self, time_ms: Optional[int]):
+        self._w_position.set_anchors([] if time_ms is None else [time_ms])
+
     def __on_slider_moved(self, value: int):
         self._current_pos = value
         self.seek.emit(self._current_pos)
@@ -162,13 +192,61 @@ class PlayerControl(VLayoutWidget):
 
     def __on_speed_changed(self, value):
         speed = self.SPEED_VALUES[value]
-        self._w_speed_label.setText('%d%%' % speed)
+        if speed >= self.SCAN_SPEED_MIN:
+            self._w_speed_label.setText('%dx ⏩' % (speed // 100))
+        else:
+            self._w_speed_label.setText('%d%%' % speed)
         self.speed_changed.emit(speed/100.0)
 
     def set_controls_enabled(self, enabled: bool):
-        for control in [self._w_btn_set_anchor, self._w_position]:
+        for control in [self._w_btn_set_anchor, self._w_position, self._w_btn_compare]:
             control.setEnabled(enabled)
 
+    def set_return_to_anchor_enabled(self, enabled: bool):
+        """
+        Return to anchor is available during playback, so it's enabled separately from the other controls
+        """
+        self._w_btn_return_to_anchor.setEnabled(enabled and self._w_btn_set_anchor.isChecked())
+
+
+class QueueControl(HLayoutWidget):
+    open_folder_clicked = Signal()
+    open_list_clicked = Signal()
+    next_clicked = Signal()
+
+    def __init__(self):
+        super().__init__()
+
+        self._w_btn_queue = QPushButton('Queue')
+        self._w_queue_menu = QMenu(self._w_btn_queue)
+        self._w_queue_menu.addAction('From folder...', self.open_folder_clicked.emit)
+        self._w_queue_menu.addAction('From list file...', self.open_list_clicked.emit)
+        self._w_btn_queue.setMenu(self._w_queue_menu)
+        self._w_label = QLabel()
+        self._w_btn_next = QPushButton('Next ⏭')
+
+        self.add_widget(self._w_btn_queue)
+        self.add_widget(self._w_label)
+        self.add_spacer()
+        self.add_widget(self._w_btn_next)
+
+        self._w_btn_next.clicked.connect(self.next_clicked)
+
+        self.set_status(None, 0, False)
+
+    def set_status(self, current: Optional[int], total: int, has_next: bool):
+        """
+        :param current: index of the current item, None if there is no queue
+        :param total: number of items in the queue
+        :param has_next: True if there is a next item
+        """
+        if current is None:
+            self._w_label.setText('')
+        else:
+            self._w_label.setText('%d / %d' % (current + 1, total))
+        self._w_btn_next.setEnabled(has_next)
+
+
 @dataclass
 class VideoRecord:
     index: int
@@ -180,12 +258,15 @@ class VideoRecord:
     anchor: Optional[int]
     is_playing: bool = False
     anchor_offset_to_first: Optional[int] = None
+    metadata: Optional[dict] = None
+    playback_start_position: Optional[int] = None
+    arrange_target: Optional[int] = None
 
 
 class AppWindow(QMainWindow):
     is_playing = False
 
-    def __init__(self, parent: PySide6.QtWidgets.QWidget = None):
+    def __init__(self, parent: QWidget = None):
         super().__init__(parent)
 
         if os.environ.get('SYNCVIDEOPLAYERDEBUG', None) is not None:
@@ -202,9 +283,46 @@ class AppWindow(QMainWindow):
         self._hk_playback = QShortcut(QKeySequence(Qt.Key_Space), self)
         self._hk_playback.setContext(Qt.ApplicationShortcut)
         self._hk_playback.activated.connect(self.__on_play_clicked)
+        self._hk_next_event = QShortcut(QKeySequence(Qt.Key_PageDown), self)
+        self._hk_next_event.setContext(Qt.ApplicationShortcut)
+        self._hk_next_event.activated.connect(lambda: self.__jump_to_event(True))
+        self._hk_prev_event = QShortcut(QKeySequence(Qt.Key_PageUp), self)
+        self._hk_prev_event.setContext(Qt.ApplicationShortcut)
+        self._hk_prev_event.activated.connect(lambda: self.__jump_to_event(False))
+
+        self._hk_next_item = QShortcut(QKeySequence('Ctrl+N'), self)
+        self._hk_next_item.setContext(Qt.ApplicationShortcut)
+        self._hk_next_item.activated.connect(self.__on_next_queue_item)
+
+        self._hk_trace = QShortcut(QKeySequence('Ctrl+Shift+T'), self)
+        self._hk_trace.setContext(Qt.ApplicationShortcut)
+        self._hk_trace.activated.connect(self.__toggle_tracing)
+
+        self._hk_zoom = []
+        for key, fn in [(QKeySequence.ZoomIn, lambda: self.__change_zoom(ZOOM_STEP)),
+                        (QKeySequence('Ctrl+='), lambda: self.__change_zoom(ZOOM_STEP)),
+                        (QKeySequence.ZoomOut, lambda: self.__change_zoom(1 / ZOOM_STEP)),
+                        (QKeySequence('Ctrl+0'), self.__reset_zoom),
+                        (QKeySequence('Ctrl+Left'), lambda: self.__change_pan(0, -1)),
+                        (QKeySequence('Ctrl+Right'), lambda: self.__change_pan(0, 1)),
+                        (QKeySequence('Ctrl+Up'), lambda: self.__change_pan(1, -1)),
+                        (QKeySequence('Ctrl+Down'), lambda: self.__change_pan(1, 1))]:
+            hk = QShortcut(QKeySequence(key), self)
+            hk.setContext(Qt.ApplicationShortcut)
+            hk.activated.connect(fn)
+            self._hk_zoom.append(hk)
 
         self.__playback_ready = False
         self.__fixings_invalid = True
+        self.__scan_mode = False
+        self.__arranging = set()
+        self.__arrange_started = 0.0
+        self._arrange_timer = QTimer(self)
+        self._arrange_timer.setSingleShot(True)
+        self._arrange_timer.setInterval(ARRANGE_TIMEOUT)
+        self._arrange_timer.timeout.connect(self.__finish_arrange)
+        self.__zoom = 1.0
+        self.__pan = [0.5, 0.5]
 
         self._main_panel_layout = QVBoxLayout()
 
@@ -212,12 +330,14 @@ class AppWindow(QMainWindow):
         self._w_main_panel.setLayout(self._main_panel_layout)
 
         self._w_player_control = PlayerControl()
+        self._w_queue_control = QueueControl()
+        self._queue: Optional['ReviewQueue'] = None
 
         self.setCentralWidget(self._w_main_panel)
 
         self._records = [
-            VideoRecord(0, VideoPanel(), None, 0, 0, 0, None, is_playing=False, anchor_offset_to_first=None),
-            VideoRecord(1, VideoPanel(), None, 0, 0, 0, None, is_playing=False, anchor_offset_to_first=None),
+            VideoRecord(idx, VideoPanel(), None, 0, 0, 0, None, is_playing=False, anchor_offset_to_first=None)
+            for idx in range(PANELS_COUNT)
         ]
         for vr in self._records:
             vr.panel.clicked_open_video.connect(self.__fn_click_open_video(vr))
@@ -226,9 +346,11 @@ class AppWindow(QMainWindow):
             vr.panel.playback_toggled.connect(self.__fn_playback_toggled(vr))
             vr.panel.seek.connect(self.__fn_panel_seek(vr))
             vr.panel.pos_changed.connect(self.__fn_panel_pos_changed(vr))
+            vr.panel.playback_restarted.connect(self.__fn_playback_restarted(vr))
             self._main_panel_layout.addWidget(vr.panel)
         self._records[0].panel.pos_changed.connect(self.__on_pos_changed)
 
+        self._main_panel_layout.addWidget(self._w_queue_control)
         self._main_panel_layout.addWidget(self._w_player_control)
 
         self._w_player_control.play_clicked.connect(self.__on_play_clicked)
@@ -237,12 +359,31 @@ class AppWindow(QMainWindow):
         self._w_player_control.anchor_clicked.connect(self.__on_anchor)
         self._w_player_control.return_to_anchor_clicked.connect(self.__on_return_to_anchor)
         self._w_player_control.about_clicked.connect(self.__on_about)
+        self._w_player_control.compare_clicked.connect(self.__on_compare)
+        self._w_queue_control.open_folder_clicked.connect(self.__on_open_queue_folder)
+        self._w_queue_control.open_list_clicked.connect(self.__on_open_queue_list)
+        self._w_queue_control.next_clicked.connect(self.__on_next_queue_item)
 
         self.__update_control_status()
 
+    def changeEvent(self, event: QEvent):
+        if event.type() == QEvent.WindowStateChange:
+            # videos are not decoded while the window is minimized
+            for vr in self._records:
+                vr.panel.set_window_minimized(self.isMinimized())
+        super().changeEvent(event)
+
+    def closeEvent(self, event: QCloseEvent):
+        # player processes and shared memory blocks are not released by the interpreter exit
+        self._arrange_timer.stop()
+        for vr in self._records:
+            vr.panel.terminate()
+        player_pool.terminate()
+        super().closeEvent(event)
+
     def __update_range(self):
         min_length = min([panel.duration or 0 for panel in self._records])
-        logger.debug('Current min length: %dms' % min_length)
+        logger.debug('Current min length: %dms', min_length)
         self._w_player_control.set_length(min_length)
 
     def __update_control_status(self):
@@ -251,9 +392,12 @@ class AppWindow(QMainWindow):
         self._w_player_control.setEnabled(self.__playback_ready)
 
     def __update_panels_status(self, is_playing: bool):
+        # controls stay disabled until the videos are realigned after playback
+        enabled = not is_playing and not self.__arranging
         for vr in self._records:
-            vr.panel.set_controls_enabled(not is_playing)
-        self._w_player_control.set_controls_enabled(not is_playing)
+            vr.panel.set_controls_enabled(enabled)
+        self._w_player_control.set_controls_enabled(enabled)
+        self._w_player_control.set_return_to_anchor_enabled(not self.__arranging)
 
     def __fix_after_seek_panel(self, vr: VideoRecord, time_ms: int):
         """
@@ -261,16 +405,18 @@ class AppWindow(QMainWindow):
         :param vr: video to update fixing for
         :param time_ms: fixing time
         """
-        # if seek is performed after playing the videos, recalculate offsets based on positions of the videos
-        if self.__fixings_invalid:
-            for vri in self._records:
-                vri.fixing_time = vri.position
-            logger.debug('Fixings for panels: %s' % (', '.join([str(x.fixing_time) for x in self._records])))
-        vr.fixing_time = time_ms
-        self.__lock_offsets()
-        min_fixing = min([x.fixing_time for x in self._records])
-        self._w_player_control.update_position(min_fixing)
-        self.__fixings_invalid = False
+        with tracer.span('fix-after-seek', 'panel %d, %d', vr.index, time_ms):
+            # if seek is performed after playing the videos, recalculate offsets based on positions of the videos
+            if self.__fixings_invalid:
+                for vri in self._records:
+                    vri.fixing_time = vri.position
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug('Fixings for panels: %s', ', '.join([str(x.fixing_time) for x in self._records]))
+            vr.fixing_time = time_ms
+            self.__lock_offsets()
+            min_fixing = min([x.fixing_time for x in self._records])
+            self._w_player_control.update_position(min_fixing)
+            self.__fixings_invalid = False
 
     def __fn_panel_seek(self, vr: VideoRecord):
         def fn(time_ms: int):
@@ -279,37 +425,41 @@ class AppWindow(QMainWindow):
 
     def __fn_panel_pos_changed(self, vr: VideoRecord):
         def fn(time_ms: int):
-            vr.position = time_ms
-            vr.panel.update_position(time_ms)
-            if vr.anchor is not None:
-                self.__update_anchor(vr)
+            with tracer.span('ui-position', 'panel %d, %d', vr.index, time_ms):
+                vr.position = time_ms
+                vr.panel.update_position(time_ms)
+                if vr.anchor is not None:
+                    self.__update_anchor(vr)
         return fn
 
     def __fn_playback_toggled(self, vr: VideoRecord):
         def fn(is_playing: bool):
-            logger.debug('Video playback status changed for panel %s, is_playing=%s' % (str(vr), str(is_playing)))
-            # if one of the videos stopped playing - stop all the videos
-            # we are not afraid of reentrance, because the events are edge triggered
-            prev_any_playing = any(x.is_playing for x in self._records)
-            vr.is_playing = is_playing
-            curr_any_playing = any(x.is_playing for x in self._records)
-            if not is_playing:
-                self.__stop_playback()
-            else:
-                # This means that first panel seek after this will result in fixings recalculations
-                self.__fixings_invalid = True
+            with tracer.span('playback-toggled', 'panel %d, is_playing=%s', vr.index, is_playing):
+                self.__on_playback_toggled(vr, is_playing)
+        return fn
+
+    def __on_playback_toggled(self, vr: VideoRecord, is_playing: bool):
+        logger.debug('Video playback status changed for panel %s, is_playing=%s', vr, is_playing)
+        # if one of the videos stopped playing - stop all the videos
+        # we are not afraid of reentrance, because the events are edge triggered
+        prev_any_playing = any(x.is_playing for x in self._records)
+        vr.is_playing = is_playing
+        curr_any_playing = any(x.is_playing for x in self._records)
+        if not is_playing:
+            self.__stop_playback()
+        else:
+            # This means that first panel seek after this will result in fixings recalculations
+            self.__fixings_invalid = True
 
-            if not is_playing and curr_any_playing != prev_any_playing:
-                ...
-                # do nothing yet, arrange doesn't work as expected yet
-                # self.__arrange_positions()
+        if not is_playing and curr_any_playing != prev_any_playing:
+            # videos stop independently, a frame or two apart (or more in scan mode)
+            self.__arrange_positions()
 
-            self.__update_panels_status(is_playing)
-        return fn
+        self.__update_panels_status(is_playing)
 
     def __fn_duration_known(self, vr: VideoRecord):
         def fn(duration: int):
-            logger.debug('Known duration for panel %s, duration=%d' % (str(vr), duration))
+            logger.debug('Known duration for panel %s, duration=%d', vr, duration)
             vr.duration = duration
             self.__update_range()
         return fn
@@ -330,6 +480,7 @@ class AppWindow(QMainWindow):
         return fn
 
     def __open_video(self, vr: VideoRecord, fname: str):
+        self.__reset_arrange()
         self.__clear_anchor()
         vr.panel.set_video(fname)
         vr.panel.update_position(0)
@@ -339,6 +490,145 @@ class AppWindow(QMainWindow):
         self.__fixings_invalid = True
         self.__fix_after_seek_panel(vr, 0)
 
+        # metadata and queue modules are imported on first use, they are not needed to show the window
+        from syncvideoplayer.mediameta import read_media_metadata
+        vr.metadata = read_media_metadata(fname)
+        self.__propose_metadata_alignment()
+
+    def __propose_metadata_alignment(self):
+        """
+        When all the videos are loaded and their metadata contains start time, offers to align videos by it
+        """
+        if not all(vr.panel.has_video() and vr.metadata is not None for vr in self._records):
+            return
+        from syncvideoplayer.mediameta import propose_positions
+        proposal = propose_positions([vr.metadata for vr in self._records])
+        if proposal is None:
+            return
+        field, positions = proposal
+        if not any(positions):
+            return
+        source = 'timecodes' if field == 'timecode' else 'creation times'
+        text = 'According to %s, the videos start at different moments:<br/>%s<br/><br/>Align the videos?' % (
+            source, '<br/>'.join('Video %d: %s' % (vr.index + 1, ms_to_str(position))
+                                 for vr, position in zip(self._records, positions)))
+        # not modal, so the user may inspect the videos before accepting
+        box = QMessageBox(QMessageBox.Question, 'Align videos', text, QMessageBox.Yes | QMessageBox.No, self)
+        box.setModal(False)
+        box.setAttribute(Qt.WA_DeleteOnClose)
+
+        def on_clicked(button):
+            if box.standardButton(button) == QMessageBox.Yes:
+                self.__align_at_positions(positions)
+
+        box.buttonClicked.connect(on_clicked)
+        box.show()
+
+    def __align_at_positions(self, positions: List[int]):
+        """
+        Seeks the videos to the positions and uses them as offsets between the videos
+        :param positions: positions of the videos, ms
+        """
+        if self.is_playing:
+            self.__stop_playback()
+        self.__reset_arrange()
+        self.__clear_anchor()
+        for vr, position in zip(self._records, positions):
+            vr.panel.set_position(position)
+            vr.panel.update_position(position)
+            vr.position = position
+        self.__fix_at_positions()
+
+    def open_videos(self, fnames: List[str]):
+        """
+        Opens videos in the panels, in order
+        :param fnames: list of files, extra files are ignored
+        """
+        for vr, fname in zip(self._records, fnames):
+            self.__open_video(vr, fname)
+
+    def open_queue(self, path: str):
+        """
+        Loads review queue and opens its first item
+        :param path: folder with videos or list file
+        """
+        from syncvideoplayer.reviewqueue import ReviewQueue
+
+        try:
+            queue = ReviewQueue.load(path, len(self._records))
+        except OSError as e:
+            QMessageBox.warning(self, 'Queue', 'Unable to load queue: %s' % str(e))
+            return
+        if not len(queue):
+            QMessageBox.warning(self, 'Queue', 'No videos found in %s' % path)
+            return
+        self._queue = queue
+        self.__on_next_queue_item()
+
+    def __on_open_queue_folder(self):
+        path = QFileDialog.getExistingDirectory(self, 'Open folder with videos')
+        if path:
+            self.open_queue(path)
+
+    def __on_open_queue_list(self):
+        path, _ = QFileDialog.getOpenFileName(self, 'Open list of videos', None,
+                                              'Lists (*.txt *.lst);;All files (*.*)')
+        if path:
+            self.open_queue(path)
+
+    def __on_next_queue_item(self):
+        if self._queue is None or self._queue.peek_next() is None:
+            return
+        from syncvideoplayer.reviewqueue import save_position
+
+        self.__stop_playback()
+        # remember where the review of the current videos was finished
+        if self._queue.get_current_index() >= 0:
+            for vr in self._records:
+                if vr.panel.get_video_path() is not None:
+                    save_position(vr.panel.get_video_path(), vr.position)
+        self.__open_queue_item(self._queue.advance())
+
+        next_item = self._queue.peek_next()
+        if next_item is not None:
+            for vr, entry in zip(self._records, next_item):
+                vr.panel.preload(entry.fname, entry.get_position())
+        self._w_queue_control.set_status(self._queue.get_current_index(), len(self._queue), next_item is not None)
+
+    def __open_queue_item(self, entries: List['QueueEntry']):
+        """
+        Opens videos at their saved positions, offsets between videos are set from the positions
+        """
+        from syncvideoplayer.mediameta import read_media_metadata
+
+        logger.debug('Opening queue item %d: %s', self._queue.get_current_index(), entries)
+        self.__reset_arrange()
+        for vr, entry in zip(self._records, entries):
+            position = entry.get_position()
+            vr.panel.set_video(entry.fname, position)
+            vr.panel.update_position(position)
+            vr.position = position
+            vr.metadata = read_media_metadata(entry.fname)
+            # pause of the replaced player is not reported after swapping to the preloaded one
+            vr.is_playing = False
+        self.__update_panels_status(False)
+        self.__clear_anchor()
+        self.__update_control_status()
+        self.__fix_at_positions()
+
+    def __fix_at_positions(self):
+        """
+        Uses current positions of the videos as fixings, so offsets between videos are set from them
+        """
+        for vr in self._records:
+            vr.fixing_time = vr.position
+        self.__lock_offsets()
+        self._w_player_control.update_position(min([x.fixing_time for x in self._records]))
+        self.__fixings_invalid = False
+
+    def panels(self) -> List[VideoPanel]:
+        return [vr.panel for vr in self._records]
+
     def __update_panels_positions(self):
         """
         Updates displayed position for each video.
@@ -355,6 +645,9 @@ class AppWindow(QMainWindow):
     def __start_playback(self):
         self.is_playing = True
 
+        for vr in self._records:
+            vr.playback_start_position = vr.position
+
         # lock offsets for anchor before playback
         if self._records[0].anchor is not None:
             for vr in self._records[1:]:
@@ -366,7 +659,7 @@ class AppWindow(QMainWindow):
             vr.panel.start_playback()
 
     def __on_play_clicked(self):
-        if not self.__playback_ready:
+        if not self.__playback_ready or self.__arranging:
             return
 
         if self.is_playing:
@@ -389,6 +682,59 @@ class AppWindow(QMainWindow):
         self._seek(time_ms)
         self.__update_panels_positions()
 
+    def __jump_to_event(self, forward: bool):
+        """
+        Seeks all the videos to the closest event found in any of the videos, keeping offsets between videos
+        :param forward: True to jump to the next event, False to the previous one
+        """
+        if not self.__playback_ready or self.is_playing:
+            return
+        current_pos = self._w_player_control.get_current_pos()
+        candidates = []
+        for vr in self._records:
+            event = find_event(vr.panel.get_events(), current_pos + vr.offset, forward)
+            if event is not None:
+                candidates.append(event - vr.offset)
+        if not candidates:
+            return
+        time_ms = max(0, min(candidates) if forward else max(candidates))
+        logger.debug('Jump to event at %d', time_ms)
+        self.__seek_global(time_ms)
+
+    def __apply_zoom(self):
+        logger.debug('Zoom %.2f, pan %.2f:%.2f', self.__zoom, *self.__pan)
+        for vr in self._records:
+            vr.panel.set_zoom(self.__zoom, *self.__pan)
+
+    def __change_zoom(self, factor: float):
+        """
+        Zooms all the videos in or out, keeping the same region for all of them
+        :param factor: zoom multiplier
+        """
+        zoom = min(ZOOM_MAX, max(1.0, self.__zoom * factor))
+        if abs(zoom - self.__zoom) < 1e-6:
+            return
+        self.__zoom = zoom
+        self.__apply_zoom()
+
+    def __reset_zoom(self):
+        self.__zoom = 1.0
+        self.__pan = [0.5, 0.5]
+        self.__apply_zoom()
+
+    def __change_pan(self, axis: int, direction: int):
+        """
+        Moves zoomed region of all the videos
+        :param axis: 0 - horizontal, 1 - vertical
+        :param direction: -1 or 1
+        """
+        if self.__zoom <= 1.0:
+            return
+        # pan is a position within the hidden part of the frame, convert step to it
+        step = PAN_STEP / (self.__zoom - 1.0)
+        self.__pan[axis] = min(1.0, max(0.0, self.__pan[axis] + direction * step))
+        self.__apply_zoom()
+
     def __lock_offsets(self):
         """
         Calculates video offsets based on their fixings
@@ -402,8 +748,9 @@ class AppWindow(QMainWindow):
         Sets positions of all the videos to the corresponding global position
         :param time_ms: global position
         """
-        for vr in self._records:
-            vr.panel.set_position(time_ms + vr.offset)
+        with tracer.span('global-seek', '%d', time_ms):
+            for vr in self._records:
+                vr.panel.set_position(time_ms + vr.offset)
 
     def __on_anchor(self, is_anchor_set: bool):
         if is_anchor_set:
@@ -418,8 +765,10 @@ class AppWindow(QMainWindow):
         """
         for vr in self._records:
             vr.anchor = vr.position
+            vr.panel.set_anchor(vr.anchor)
             self.__update_anchor(vr)
-            logger.debug('Set anchor positions: [%s]' % (', '.join([str(x.anchor) for x in self._records])))
+            logger.debug('Set anchor positions: [%s]', ', '.join([str(x.anchor) for x in self._records]))
+        self._w_player_control.set_anchor(self._w_player_control.get_current_pos())
 
     def __clear_anchor(self):
         """
@@ -428,8 +777,10 @@ class AppWindow(QMainWindow):
         """
         for vr in self._records:
             vr.anchor = None
+            vr.panel.set_anchor(None)
             vr.panel.clear_text_osd(ANCHOR_OVERLAY)
-            logger.debug('Clear anchor positions: [%s]' % (', '.join([str(x.anchor) for x in self._records])))
+            logger.debug('Clear anchor positions: [%s]', ', '.join([str(x.anchor) for x in self._records]))
+        self._w_player_control.set_anchor(None)
 
     def __update_anchor(self, vr: VideoRecord):
         """
@@ -451,36 +802,165 @@ class AppWindow(QMainWindow):
 
     def __arrange_positions(self):
         """
-        When playback is stopped and anchor is set, we try to maintain the same offset between videos
-        that was on the start of playback.
+        When playback is stopped, restores the offsets between videos that were on the start of playback.
+        Target of each video is snapped to its frame grid, all the videos are seeked exactly and controls
+        are disabled until all the seeks are finished.
+        """
+        if any(vr.playback_start_position is None or not vr.panel.has_video() for vr in self._records):
+            return
+        self.__arrange_started = time.perf_counter()
+        first = self._records[0]
+        first_position = first.panel.get_position()
+        if first_position is None:
+            return
+        elapsed = first_position - first.playback_start_position
+        targets = [vr.playback_start_position + elapsed for vr in self._records]
+        # realign once per playback, late pause events must not trigger it again
+        for vr in self._records:
+            vr.playback_start_position = None
+        # shift all the videos if some of them exceed their length or start
+        negative_fixup = max([0] + [t - vr.duration for t, vr in zip(targets, self._records)
+                                    if vr.duration is not None])
+        positive_fixup = max([0] + [-t for t in targets])
+        shift = positive_fixup - negative_fixup
+
+        self.__arranging = set()
+        for vr, target in zip(self._records, targets):
+            target += shift
+            frame_duration = vr.panel.get_frame_duration()
+            if frame_duration:
+                target = int(round(round(target / frame_duration) * frame_duration))
+            vr.arrange_target = target
+            position = vr.panel.get_position()
+            # video is already at the target frame
+            if position is not None and abs(position - target) < (frame_duration or EDGE_ANCHOR_DELTA) / 2:
+                continue
+            self.__arranging.add(vr.index)
+        logger.debug('Arranging positions: targets [%s], seeking %s',
+                     ', '.join(str(vr.arrange_target) for vr in self._records), self.__arranging)
+        if not self.__arranging:
+            self.__finish_arrange()
+            return
+        self.__update_panels_status(False)
+        self._arrange_timer.start()
+        with tracer.span('arrange-seek'):
+            for vr in self._records:
+                if vr.index in self.__arranging:
+                    vr.panel.set_position(vr.arrange_target)
+
+    def __reset_arrange(self):
+        """
+        Abandons realignment after playback, called when videos are positioned by other means
         """
-        if self._records[0].anchor is None:
+        was_arranging = bool(self.__arranging)
+        self._arrange_timer.stop()
+        self.__arranging = set()
+        for vr in self._records:
+            vr.playback_start_position = None
+            vr.arrange_target = None
+        if was_arranging:
+            self.__update_panels_status(self.is_playing)
+
+    def __fn_playback_restarted(self, vr: VideoRecord):
+        def fn():
+            if vr.index not in self.__arranging:
+                return
+            self.__arranging.discard(vr.index)
+            if not self.__arranging:
+                self.__finish_arrange()
+        return fn
+
+    def __finish_arrange(self):
+        """
+        Called when all the realignment seeks are finished or timed out.
+        Locks offsets at the targets, reports the time and the remaining error.
+        """
+        self._arrange_timer.stop()
+        timed_out = bool(self.__arranging)
+        self.__arranging = set()
+        elapsed = (time.perf_counter() - self.__arrange_started) * 1000
+
+        errors = []
+        for vr in self._records:
+            position = vr.panel.get_position()
+            frame_duration = vr.panel.get_frame_duration()
+            if position is not None and frame_duration:
+                errors.append((position - vr.arrange_target) / frame_duration)
+            vr.panel.update_position(vr.arrange_target)
+            vr.position = vr.arrange_target
+        self.__fix_at_positions()
+        self.__update_panels_status(self.is_playing)
+
+        max_error = max([abs(x) for x in errors], default=0.0)
+        message = 'Videos realigned in %d ms, error %.1f frames%s' % (
+            elapsed, max_error, ' (timed out)' if timed_out else '')
+        logger.info('%s: [%s]', message, ', '.join('%+.2f' % x for x in errors))
+        tracer.instant('arrange', '%s', message)
+        self.statusBar().showMessage(message, ARRANGE_STATUS_TIMEOUT)
+
+    def __toggle_tracing(self):
+        """
+        Starts recording trace, or stops it and offers to save the recorded trace
+        """
+        if not tracer.enabled:
+            tracer.set_enabled(True)
             return
-        # position all videos according to their offsets to the first one
-        positions = [x.position for x in self._records]
-        delta_first = self._records[0].position - self._records[0].anchor
-        for idx in range(1, len(self._records)):
-            positions[idx] = self._records[idx].anchor + delta_first + self._records[idx].anchor_offset_to_first
-        # cap positions if they exceed length
-        negative_fixup = 0
-        for idx in range(0, len(self._records)):
-            if positions[idx] > self._records[idx].duration:
-                negative_fixup = max(negative_fixup, positions[idx] - self._records[idx].duration)
-        positions_corrected = [x - negative_fixup for x in positions]
-        for idx, vr in enumerate(self._records):
-            vr.panel.set_position(positions_corrected[idx])
+        tracer.set_enabled(False)
+        fname, _ = QFileDialog.getSaveFileName(self, 'Save trace', 'syncvideoplayer-trace.json',
+                                               'Chrome trace (*.json);;All files (*.*)')
+        if fname:
+            tracer.export_chrome_trace(fname)
 
     def __on_about(self):
         QMessageBox.about(self, 'About', ABOUT_TEXT)
 
+    def __on_compare(self):
+        """
+        Opens comparison of the first two videos, starting from the current position
+        """
+        # imported here, because it requires numpy, which is not needed for playback
+        from syncvideoplayer.comparedialog import CompareDialog
+
+        records = self._records[:2]
+        # global time at which the earliest ending video ends
+        end = min([vr.duration - vr.offset for vr in records if vr.duration is not None],
+                  default=self._w_player_control.get_length())
+        end = max(0, end)
+        dialog = CompareDialog([vr.panel.get_video_path() for vr in records], [vr.offset for vr in records],
+                               min(self._w_player_control.get_current_pos(), end), end, self)
+        dialog.seek.connect(self.__seek_global)
+        dialog.show()
+
+    def __seek_global(self, time_ms: int):
+        if self.is_playing:
+            return
+        self.__reset_arrange()
+        self._w_player_control.update_position(time_ms)
+        self.__on_seek(time_ms)
+
     def __on_speed_changed(self, speed: float):
+        scan_mode = speed * 100 >= PlayerControl.SCAN_SPEED_MIN
         for vr in self._records:
+            vr.panel.set_scan_mode(scan_mode)
             vr.panel.set_speed(speed)
+        if self.__scan_mode and not scan_mode and self.is_playing:
+            # return to normal playback, videos may have drifted apart while scanning
+            self.__realign_to_first()
+        self.__scan_mode = scan_mode
+
+    def __realign_to_first(self):
+        """
+        Seeks all the videos to the position of the first one, keeping current offsets between videos
+        """
+        time_ms = max(0, self._records[0].position - self._records[0].offset)
+        self._w_player_control.update_position(time_ms)
+        self._seek(time_ms)
 
     def __on_return_to_anchor(self):
         """
         Called when user presses "back to anchor" button. Seeks all the videos to their stored anchor positions.
         """
+        self.__reset_arrange()
         for vr in self._records:
             vr.panel.set_position(vr.anchor)
             vr.panel.update_position(vr.anchor)
@@ -489,8 +969,27 @@ class AppWindow(QMainWindow):
             self.__fix_after_seek_panel(vr, vr.anchor)
 
 
-if __name__ == '__main__':
-    import sys
+def _report_first_frames(window: AppWindow, count: int, app: QApplication):
+    """
+    Prints time when first frames of all the videos are shown and quits. Used by startup benchmark.
+    """
+    pending = set(range(count))
+
+    def fn_restarted(idx: int):
+        def fn():
+            pending.discard(idx)
+            if not pending:
+                print('FIRST_FRAMES_SHOWN %.6f' % time.time(), flush=True)
+                app.quit()
+        return fn
+
+    for idx, panel in enumerate(window.panels()[:count]):
+        panel.playback_restarted.connect(fn_restarted(idx))
+
+
+def main():
+    # player processes and comparison workers are spawned, in a frozen build they re-run this executable
+    multiprocessing.freeze_support()
 
     logFormatter = logging.Formatter("%(asctime)s [%(name)s] [%(levelname)-5.5s]  %(message)s")
 
@@ -500,10 +999,38 @@ if __name__ == '__main__':
     consoleHandler.setFormatter(logFormatter)
     logging.getLogger().addHandler(consoleHandler)
 
+    if os.environ.get('SYNCVIDEOPLAYERTRACE', None) is not None:
+        tracer.set_enabled(True)
+
     app = QApplication(sys.argv)
     app.setStyle("Fusion")
     app.setPalette(dark_palette)
 
+    # Qt options are already removed from the arguments by QApplication
+    parser = argparse.ArgumentParser(prog='syncvideoplayer')
+    parser.add_argument('files', nargs='*', help='videos to open, one per panel')
+    parser.add_argument('--queue', metavar='PATH', help='folder with videos or list file to review')
+    parser.add_argument('--process-per-panel', action='store_true',
+                        default=os.environ.get('SYNCVIDEOPLAYERPROCESSES', None) is not None,
+                        help='run each player in a separate process')
+    parser.add_argument('--startup-benchmark', action='store_true',
+                        help='print time when first frames of all the videos are shown and exit')
+    args = parser.parse_args(app.arguments()[1:])
+
+    use_player_processes(args.process_per_panel)
+    # libmpv loading and player creation overlap with window construction
+    player_pool.prewarm(PANELS_COUNT)
+
     main_window = AppWindow()
     main_window.show()
+    if args.startup_benchmark:
+        _report_first_frames(main_window, min(len(args.files), PANELS_COUNT), app)
+    if args.queue:
+        main_window.open_queue(args.queue)
+    else:
+        main_window.open_videos(args.files)
     sys.exit(app.exec())
+
+
+if __name__ == '__main__':
+    main()
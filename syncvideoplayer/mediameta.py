@@ -0,0 +1,187 @@
+# Sync Player
+# Copyright (C) 2023, Roman Arsenikhin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import struct
+from typing import Optional, List, BinaryIO, Iterator, Tuple
+
+from syncvideoplayer.cache import load_cached, store_cached
+
+logger = logging.getLogger(__name__)
+
+CACHE_KIND = 'metadata'
+# bump when parsing changes, so stale metadata is read again
+METADATA_VERSION = 1
+
+# seconds between 1904-01-01 (QuickTime epoch) and 1970-01-01
+QUICKTIME_EPOCH_OFFSET = 2082844800
+# moov box is read into memory, larger ones are considered broken
+MAX_MOOV_SIZE = 64 * 1024 * 1024
+CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+
+
+def _iter_boxes(data: bytes, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[bytes, int, int]]:
+    """
+    Iterates over ISO BMFF boxes in the buffer
+    :return: (type, payload start, payload end)
+    """
+    end = len(data) if end is None else end
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', data, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            return
+        yield box_type, pos + header, pos + size
+        pos += size
+
+
+def _find_box(data: bytes, path: List[bytes], start: int = 0, end: Optional[int] = None) -> Optional[Tuple[int, int]]:
+    for box_type, payload_start, payload_end in _iter_boxes(data, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return payload_start, payload_end
+            return _find_box(data, path[1:], payload_start, payload_end)
+    return None
+
+
+def _read_moov(f: BinaryIO) -> Optional[bytes]:
+    """
+    Reads moov box, skipping media data without reading it
+    """
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return None
+        size, box_type = struct.unpack('>I4s', header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            return f.read() if box_type == b'moov' else None
+        if size < header_size:
+            return None
+        if box_type == b'moov':
+            if size > MAX_MOOV_SIZE:
+                return None
+            return f.read(size - header_size)
+        f.seek(size - header_size, 1)
+
+
+def _parse_mvhd(moov: bytes) -> dict:
+    box = _find_box(moov, [b'mvhd'])
+    if box is None:
+        return {}
+    start, _ = box
+    version = moov[start]
+    if version == 1:
+        creation, _, timescale, duration = struct.unpack_from('>QQIQ', moov, start + 4)
+    else:
+        creation, _, timescale, duration = struct.unpack_from('>IIII', moov, start + 4)
+    result = {}
+    if creation:
+        result['creation_time'] = creation - QUICKTIME_EPOCH_OFFSET
+    if timescale:
+        result['duration'] = duration * 1000 // timescale
+    return result
+
+
+def _parse_timecode(moov: bytes, f: BinaryIO) -> Optional[float]:
+    """
+    Reads start timecode from tmcd track: frame number stored in the first sample, converted using
+    the frame rate from the sample description. Only 4 bytes of media data are read.
+    :return: seconds since midnight
+    """
+    for box_type, trak_start, trak_end in _iter_boxes(moov):
+        if box_type != b'trak':
+            continue
+        hdlr = _find_box(moov, [b'mdia', b'hdlr'], trak_start, trak_end)
+        if hdlr is None or moov[hdlr[0] + 8:hdlr[0] + 12] != b'tmcd':
+            continue
+        stsd = _find_box(moov, [b'mdia', b'minf', b'stbl', b'stsd'], trak_start, trak_end)
+        stco = _find_box(moov, [b'mdia', b'minf', b'stbl', b'stco'], trak_start, trak_end)
+        co64 = _find_box(moov, [b'mdia', b'minf', b'stbl', b'co64'], trak_start, trak_end)
+        if stsd is None or (stco is None and co64 is None):
+            continue
+        # stsd: version/flags, entry count, then the first entry: size, format, 6 reserved, data ref index,
+        # reserved, flags, timescale, frame duration, number of frames
+        entry = stsd[0] + 8
+        if moov[entry + 4:entry + 8] != b'tmcd':
+            continue
+        timescale, frame_duration = struct.unpack_from('>II', moov, entry + 24)
+        if stco is not None:
+            chunk_offset = struct.unpack_from('>I', moov, stco[0] + 8)[0]
+        else:
+            chunk_offset = struct.unpack_from('>Q', moov, co64[0] + 8)[0]
+        f.seek(chunk_offset)
+        sample = f.read(4)
+        if len(sample) < 4 or not timescale:
+            continue
+        frame_number = struct.unpack('>I', sample)[0]
+        return frame_number * frame_duration / timescale
+    return None
+
+
+def read_media_metadata(fname: str) -> dict:
+    """
+    Reads timing metadata from container headers, without decoding: creation time (Unix time, s),
+    start timecode (s since midnight) and duration (ms). Only MP4/QuickTime containers are supported,
+    metadata is cached per file.
+    :param fname: video file
+    :return: dictionary with found values, may be empty
+    """
+    cached = load_cached(fname, CACHE_KIND)
+    if cached is not None and cached.get('version') == METADATA_VERSION:
+        return cached['metadata']
+    metadata = {}
+    try:
+        with open(fname, 'rb') as f:
+            moov = _read_moov(f)
+            if moov is not None:
+                metadata.update(_parse_mvhd(moov))
+                timecode = _parse_timecode(moov, f)
+                if timecode is not None:
+                    metadata['timecode'] = timecode
+    except (OSError, struct.error) as e:
+        logger.warning('Unable to read metadata of %s: %s', fname, e)
+    logger.debug('Metadata of %s: %s', fname, metadata)
+    store_cached(fname, CACHE_KIND, {'version': METADATA_VERSION, 'metadata': metadata})
+    return metadata
+
+
+def propose_positions(metadata: List[dict]) -> Optional[Tuple[str, List[int]]]:
+    """
+    Finds positions of the videos corresponding to the same moment, using start timecodes
+    if all the videos have them, otherwise creation times.
+    :param metadata: metadata of the videos
+    :return: used field and positions (ms), or None if metadata is missing or videos don't overlap
+    """
+    for field in ['timecode', 'creation_time']:
+        if all(field in x for x in metadata):
+            break
+    else:
+        return None
+    latest_start = max(x[field] for x in metadata)
+    positions = [round((latest_start - x[field]) * 1000) for x in metadata]
+    for position, x in zip(positions, metadata):
+        if 'duration' in x and position >= x['duration']:
+            return None
+    return field, positions
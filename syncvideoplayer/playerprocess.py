@@ -0,0 +1,279 @@
+# Sync Player
+# Copyright (C) 2023, Roman Arsenikhin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import math
+import multiprocessing
+import struct
+import threading
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+
+from PySide6.QtCore import QTimer
+
+logger = logging.getLogger(__name__)
+
+# Clock block shared by the worker (writer) and GUI process (reader), protected by a sequence lock:
+# sequence counter is odd while the fields are being written.
+CLOCK_SEQ = struct.Struct('<Q')
+# time-pos (s), duration (s), pause, playback restarts counter; NaN means "unknown"
+CLOCK_FIELDS = struct.Struct('<ddBI')
+CLOCK_SIZE = CLOCK_SEQ.size + CLOCK_FIELDS.size
+
+FIELD_TIME_POS = 0
+FIELD_DURATION = 1
+FIELD_PAUSE = 2
+FIELD_RESTARTS = 3
+
+# properties published via the clock block instead of the command pipe
+CLOCK_PROPERTIES = {'time-pos': FIELD_TIME_POS, 'duration': FIELD_DURATION, 'pause': FIELD_PAUSE}
+# state of a player which was just created: nothing is loaded, playback is paused
+CLOCK_DEFAULTS = (math.nan, math.nan, 1, 0)
+
+POLL_INTERVAL = 15
+# how long GUI waits for the reply of the player process before considering it hung, s
+REPLY_TIMEOUT = 0.5
+# attempts to read the clock block before falling back to the previous snapshot
+CLOCK_READ_ATTEMPTS = 1000
+# commands which result is not used, they are sent without waiting for the reply
+ASYNC_COMMANDS = {'osd-overlay', 'vf', 'video-reload'}
+
+
+class _ClockWriter:
+    def __init__(self, buf):
+        self._buf = buf
+        self._seq = 0
+        self._fields = list(CLOCK_DEFAULTS)
+        self._lock = threading.Lock()
+        self.__publish()
+
+    def __publish(self):
+        self._seq += 1
+        CLOCK_SEQ.pack_into(self._buf, 0, self._seq)
+        CLOCK_FIELDS.pack_into(self._buf, CLOCK_SEQ.size, *self._fields)
+        self._seq += 1
+        CLOCK_SEQ.pack_into(self._buf, 0, self._seq)
+
+    def set(self, field: int, value):
+        with self._lock:
+            self._fields[field] = value
+            self.__publish()
+
+    def increment(self, field: int):
+        with self._lock:
+            self._fields[field] += 1
+            self.__publish()
+
+
+def read_clock(buf) -> Optional[tuple]:
+    """
+    Reads consistent snapshot of the clock block
+    :return: values of the fields, or None if the writer didn't finish the update in time
+    """
+    for _ in range(CLOCK_READ_ATTEMPTS):
+        seq = CLOCK_SEQ.unpack_from(buf, 0)[0]
+        if seq & 1:
+            continue
+        fields = CLOCK_FIELDS.unpack_from(buf, CLOCK_SEQ.size)
+        if CLOCK_SEQ.unpack_from(buf, 0)[0] == seq:
+            return fields
+    return None
+
+
+def _worker_main(conn, shm_name: str, init_args: dict):
+    """
+    Entry point of the player process: executes commands from the pipe, publishes player state to the clock block
+    """
+    from mpv import MPV
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s [player %(process)d] %(message)s')
+    shm = SharedMemory(name=shm_name)
+    clock = _ClockWriter(shm.buf)
+
+    def on_log(level, component, message):
+        logger.warning('[mpv/%s] %s: %s', component, level, message.rstrip())
+
+    player = MPV(log_handler=on_log, **init_args)
+
+    def fn_property(field, convert):
+        def fn(name, value):
+            clock.set(field, math.nan if value is None else convert(value))
+        return fn
+
+    player.observe_property('time-pos', fn_property(FIELD_TIME_POS, float))
+    player.observe_property('duration', fn_property(FIELD_DURATION, float))
+    player.observe_property('pause', fn_property(FIELD_PAUSE, int))
+    player.event_callback('playback-restart')(lambda event: clock.increment(FIELD_RESTARTS))
+
+    try:
+        while True:
+            op, args, kwargs = conn.recv()
+            if op == 'terminate':
+                break
+            try:
+                if op == 'set':
+                    player[args[0]] = args[1]
+                elif op == 'get':
+                    conn.send((True, player[args[0]]))
+                elif op == 'command':
+                    conn.send((True, player.command(*args, **kwargs)))
+                elif op == 'command_async':
+                    player.command(*args, **kwargs)
+                else:
+                    getattr(player, op)(*args, **kwargs)
+            except Exception as e:
+                if op in ('get', 'command'):
+                    conn.send((False, e))
+                elif op == 'command_async':
+                    # e.g. removal of a filter which is not present
+                    logger.info('Player command %s failed: %s', args[0], e)
+                else:
+                    logger.warning('Player command %s failed: %s', op, e)
+    except EOFError:
+        ...
+    finally:
+        player.terminate()
+        shm.close()
+
+
+class RemotePlayer:
+    """
+    MPV player hosted by a separate process. Implements the subset of python-mpv interface used by VideoWidget.
+    Frequent state (position, duration, pause) is read from the shared clock block by polling on GUI thread,
+    so player callbacks don't compete with GUI for GIL. Commands are sent via a pipe, only property reads
+    wait for the reply, and not longer than REPLY_TIMEOUT. A player process which exits or doesn't reply in time
+    is considered unavailable: further commands are dropped and properties read as unknown.
+    """
+
+    def __init__(self, init_args: dict):
+        self._shm = SharedMemory(create=True, size=CLOCK_SIZE)
+        # the block is read before the worker publishes anything, zeros would read as a loaded playing video
+        CLOCK_SEQ.pack_into(self._shm.buf, 0, 0)
+        CLOCK_FIELDS.pack_into(self._shm.buf, CLOCK_SEQ.size, *CLOCK_DEFAULTS)
+        context = multiprocessing.get_context('spawn')
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(target=_worker_main, args=(child_conn, self._shm.name, init_args),
+                                        name='player', daemon=True)
+        self._process.start()
+        self._property_callbacks = []
+        self._restart_callbacks = []
+        self._last = CLOCK_DEFAULTS
+        self._timer = None
+        self._available = True
+        logger.info('Started player process pid=%d', self._process.pid)
+
+    def __mark_unavailable(self, reason: str):
+        if self._available:
+            self._available = False
+            logger.error('Player process pid=%d is unavailable: %s', self._process.pid, reason)
+
+    def __ensure_polling(self):
+        # created on first use, which happens on GUI thread
+        if self._timer is None:
+            self._timer = QTimer()
+            self._timer.setInterval(POLL_INTERVAL)
+            self._timer.timeout.connect(self.__poll)
+            self._timer.start()
+
+    def __poll(self):
+        if self._available and not self._process.is_alive():
+            self.__mark_unavailable('exited with code %s' % self._process.exitcode)
+        current = read_clock(self._shm.buf)
+        if current is None:
+            return
+        last, self._last = self._last, current
+        for name, field, callback in self._property_callbacks:
+            value = current[field]
+            # NaN != NaN, so unknown values are compared separately
+            unchanged = value == last[field] or (value != value and last[field] != last[field])
+            if not unchanged:
+                callback(name, None if value != value else (bool(value) if field == FIELD_PAUSE else value))
+        if current[FIELD_RESTARTS] != last[FIELD_RESTARTS]:
+            for callback in self._restart_callbacks:
+                callback(None)
+
+    def __send(self, op: str, *args, **kwargs) -> bool:
+        if not self._available:
+            return False
+        try:
+            self._conn.send((op, args, kwargs))
+        except OSError as e:
+            self.__mark_unavailable(str(e))
+            return False
+        return True
+
+    def __call(self, op: str, *args, **kwargs):
+        if not self.__send(op, *args, **kwargs):
+            return None
+        try:
+            if not self._conn.poll(REPLY_TIMEOUT):
+                # late reply would be taken as the reply to the next call, so the pipe can't be used anymore
+                self.__mark_unavailable('no reply to %s %s' % (op, args[0]))
+                return None
+            ok, result = self._conn.recv()
+        except (EOFError, OSError) as e:
+            self.__mark_unavailable(str(e) or type(e).__name__)
+            return None
+        if not ok:
+            raise result
+        return result
+
+    def __setitem__(self, name, value):
+        self.__send('set', name, value)
+
+    def __getitem__(self, name):
+        if name in CLOCK_PROPERTIES:
+            fields = read_clock(self._shm.buf) or self._last
+            value = fields[CLOCK_PROPERTIES[name]]
+            return None if value != value else value
+        return self.__call('get', name)
+
+    def observe_property(self, name: str, callback):
+        if name not in CLOCK_PROPERTIES:
+            raise ValueError('Property %s is not published by player process' % name)
+        self._property_callbacks.append((name, CLOCK_PROPERTIES[name], callback))
+        self.__ensure_polling()
+
+    def event_callback(self, *event_types):
+        if set(event_types) != {'playback-restart'}:
+            raise ValueError('Events %s are not published by player process' % str(event_types))
+
+        def register(callback):
+            self._restart_callbacks.append(callback)
+            self.__ensure_polling()
+            return callback
+        return register
+
+    def loadfile(self, *args, **kwargs):
+        self.__send('loadfile', *args, **kwargs)
+
+    def seek(self, *args, **kwargs):
+        self.__send('seek', *args, **kwargs)
+
+    def command(self, *args, **kwargs):
+        if args[0].replace('_', '-') in ASYNC_COMMANDS:
+            self.__send('command_async', *args, **kwargs)
+            return None
+        return self.__call('command', *args, **kwargs)
+
+    def terminate(self):
+        if self._timer is not None:
+            self._timer.stop()
+        if self.__send('terminate'):
+            self._process.join(timeout=2)
+        if self._process.is_alive():
+            self._process.kill()
+        self._shm.close()
+        self._shm.unlink()
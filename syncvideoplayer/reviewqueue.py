@@ -0,0 +1,135 @@
+# Sync Player
+# Copyright (C) 2023, Roman Arsenikhin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+from syncvideoplayer.cache import load_cached, store_cached
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = {'.mp4', '.mkv', '.avi', '.lrv', '.mov'}
+POSITION_CACHE_KIND = 'position'
+# files in a line of the list are separated by tabs or "|"
+LIST_SEPARATOR = re.compile(r'\t|\|')
+# optional position after the file name: "lap1.mp4 @ 12.5"
+POSITION_SUFFIX = re.compile(r'^(.*?)\s*@\s*(\d+(?:\.\d*)?)$')
+
+
+@dataclass
+class QueueEntry:
+    fname: str
+    position: Optional[int] = None
+
+    def get_position(self) -> int:
+        """
+        :return: position from the list, otherwise position saved during previous review, otherwise 0
+        """
+        if self.position is not None:
+            return self.position
+        cached = load_cached(self.fname, POSITION_CACHE_KIND)
+        if cached is not None:
+            return int(cached.get('position', 0))
+        return 0
+
+
+def save_position(fname: str, time_ms: int):
+    store_cached(fname, POSITION_CACHE_KIND, {'position': time_ms})
+
+
+class ReviewQueue:
+    """
+    List of video tuples reviewed one after another
+    """
+
+    def __init__(self, items: List[List[QueueEntry]]):
+        self._items = items
+        self._current = -1
+
+    @staticmethod
+    def from_folder(path: str, size: int) -> 'ReviewQueue':
+        """
+        Groups videos of the folder, sorted by name, into tuples
+        :param path: folder
+        :param size: number of videos in a tuple
+        """
+        files = sorted(str(x) for x in Path(path).iterdir()
+                       if x.is_file() and x.suffix.lower() in VIDEO_EXTENSIONS)
+        if len(files) % size:
+            logger.warning('%d videos in %s are not a multiple of %d, last ones are skipped', len(files), path, size)
+        return ReviewQueue([[QueueEntry(x) for x in files[i:i + size]]
+                            for i in range(0, len(files) - size + 1, size)])
+
+    @staticmethod
+    def from_list_file(path: str, size: int) -> 'ReviewQueue':
+        """
+        Reads list of tuples, one tuple per line, files separated by tab or "|".
+        Each file may be followed by "@ seconds" - initial position.
+        Relative paths are resolved against the list location, lines starting with "#" are ignored.
+        :param path: list file
+        :param size: number of videos in a tuple
+        """
+        base = Path(path).parent
+        items = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                entries = []
+                for part in LIST_SEPARATOR.split(line):
+                    part = part.strip()
+                    position = None
+                    match = POSITION_SUFFIX.match(part)
+                    if match:
+                        part = match.group(1)
+                        position = int(float(match.group(2)) * 1000)
+                    entries.append(QueueEntry(str(base / os.path.expanduser(part)), position))
+                if len(entries) < size:
+                    logger.warning('Line %d of %s has less than %d videos, skipped', line_no, path, size)
+                    continue
+                items.append(entries[:size])
+        return ReviewQueue(items)
+
+    @staticmethod
+    def load(path: str, size: int) -> 'ReviewQueue':
+        if os.path.isdir(path):
+            return ReviewQueue.from_folder(path, size)
+        return ReviewQueue.from_list_file(path, size)
+
+    def __len__(self):
+        return len(self._items)
+
+    def get_current_index(self) -> int:
+        return self._current
+
+    def peek_next(self) -> Optional[List[QueueEntry]]:
+        if self._current + 1 < len(self._items):
+            return self._items[self._current + 1]
+        return None
+
+    def advance(self) -> Optional[List[QueueEntry]]:
+        """
+        Moves to the next tuple
+        :return: next tuple or None if the queue is over
+        """
+        item = self.peek_next()
+        if item is not None:
+            self._current += 1
+        return item
@@ -0,0 +1,171 @@
+# Sync Player
+# Copyright (C) 2023, Roman Arsenikhin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+import threading
+from typing import List, Optional, Tuple
+
+from PySide6.QtCore import QObject, Signal
+
+
+logger = logging.getLogger(__name__)
+
+CACHE_KIND = 'events'
+# bump when detection changes, so stale indexes are rebuilt
+INDEX_VERSION = 1
+
+# analysis is performed on a downscaled stream, it's enough to detect cuts and motion
+ANALYSIS_WIDTH = 160
+SCENE_THRESHOLD = 10.0
+# frame difference peak should exceed mean by this number of standard deviations
+MOTION_PEAK_SIGMAS = 2.5
+# events closer than this are merged into one
+MIN_EVENT_DISTANCE = 1000
+
+
+def _escape_filter_value(value: str) -> str:
+    # two levels of escaping: filter option and filtergraph
+    return value.replace('\\', '/').replace(':', '\\\\:')
+
+
+def parse_metadata_log(lines) -> Tuple[List[int], List[int], List[float]]:
+    """
+    Parses output of lavfi metadata filter in print mode
+    :param lines: lines of the output
+    :return: frame times (ms), scene cut times (ms) and frame differences
+    """
+    times = []
+    cuts = []
+    diffs = []
+    for line in lines:
+        line = line.strip()
+        if line.startswith('frame:'):
+            pts_time = line.rsplit('pts_time:', 1)[-1]
+            try:
+                times.append(int(float(pts_time) * 1000))
+            except ValueError:
+                times.append(times[-1] if times else 0)
+            diffs.append(0.0)
+        elif line.startswith('lavfi.scd.mafd=') and diffs:
+            diffs[-1] = float(line.split('=', 1)[1])
+        elif line.startswith('lavfi.scd.time=') and times:
+            cuts.append(times[-1])
+    return times, cuts, diffs
+
+
+def detect_events(times: List[int], cuts: List[int], diffs: List[float]) -> List[int]:
+    """
+    Builds sorted index of events: scene cuts and peaks of motion
+    :param times: frame times (ms)
+    :param cuts: scene cut times (ms)
+    :param diffs: mean absolute difference to the previous frame for each frame
+    :return: sorted list of event times (ms)
+    """
+    import statistics
+
+    events = list(cuts)
+    if len(diffs) > 2:
+        threshold = statistics.fmean(diffs) + MOTION_PEAK_SIGMAS * statistics.pstdev(diffs)
+        for idx in range(1, len(diffs) - 1):
+            if diffs[idx] > threshold and diffs[idx - 1] <= diffs[idx] >= diffs[idx + 1]:
+                events.append(times[idx])
+    events.sort()
+    merged = []
+    for event in events:
+        if not merged or event - merged[-1] >= MIN_EVENT_DISTANCE:
+            merged.append(event)
+    return merged
+
+
+class SceneIndexer(QObject):
+    """
+    Builds index of events for a video file in background, using separate headless player
+    """
+    ready = Signal(str, list)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._lock = threading.Lock()
+        self._player = None
+        self._fname: Optional[str] = None
+
+    def analyze(self, fname: str):
+        """
+        Starts analysis of the file. Result is emitted with ready signal.
+        Cached index is used if available.
+        :param fname: video file
+        """
+        # imported here, because the index is not needed to show the window
+        from syncvideoplayer.cache import load_cached
+
+        self.cancel()
+        self._fname = fname
+        cached = load_cached(fname, CACHE_KIND)
+        if cached is not None and cached.get('version') == INDEX_VERSION:
+            logger.debug('Using cached events index for %s', fname)
+            self.ready.emit(fname, cached['events'])
+            return
+        threading.Thread(target=self.__run, args=(fname,), daemon=True).start()
+
+    def cancel(self):
+        self._fname = None
+        with self._lock:
+            if self._player is not None:
+                self._player.terminate()
+                self._player = None
+
+    def __run(self, fname: str):
+        import tempfile
+        from mpv import MPV, ShutdownError
+        from syncvideoplayer.cache import store_cached
+
+        fd, log_path = tempfile.mkstemp(prefix='syncvideoplayer-', suffix='.txt')
+        os.close(fd)
+        graph = 'scale=%d:-2,scdet=threshold=%f,metadata=mode=print:file=%s' % (
+            ANALYSIS_WIDTH, SCENE_THRESHOLD, _escape_filter_value(log_path))
+        try:
+            with self._lock:
+                if self._fname != fname:
+                    return
+                self._player = player = MPV(vo='null', audio=False, untimed=True, hwdec='no', config=False,
+                                            input_default_bindings=False, keep_open=False, loglevel='error',
+                                            vd_lavc_threads=1, vd_lavc_skiploopfilter='all', vd_lavc_fast=True,
+                                            vf='lavfi=[%s]' % graph)
+            logger.info('Building events index for %s', fname)
+            player.play(fname)
+            try:
+                player.wait_for_playback()
+            except ShutdownError:
+                return
+            with self._lock:
+                if self._player is player:
+                    player.terminate()
+                    self._player = None
+            if self._fname != fname:
+                return
+
+            with open(log_path, 'r', encoding='utf-8', errors='replace') as f:
+                events = detect_events(*parse_metadata_log(f))
+            logger.info('Events index for %s: %d events', fname, len(events))
+            store_cached(fname, CACHE_KIND, {'version': INDEX_VERSION, 'events': events})
+            self.ready.emit(fname, events)
+        except Exception:
+            logger.exception('Failed to build events index for %s', fname)
+        finally:
+            try:
+                os.remove(log_path)
+            except OSError:
+                ...
@@ -0,0 +1,282 @@
+# Sync Player
+# Copyright (C) 2023, Roman Arsenikhin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from typing import List, Tuple, Optional
+
+from PySide6.QtCore import Qt, Signal, QRect, QRectF, QSize, QEvent
+from PySide6.QtGui import QPainter, QPixmap, QColor, QPalette, QMouseEvent, QWheelEvent, QKeyEvent
+from PySide6.QtWidgets import QWidget, QSizePolicy
+
+# candidate distances between ticks, ms
+TICK_STEPS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 15000, 30000, 60000, 120000, 300000,
+              600000, 900000, 1800000, 3600000]
+MIN_TICK_SPACING = 6
+MIN_LABEL_SPACING = 70
+# every n-th tick is a major one
+MAJOR_TICK_EVERY = 5
+
+TIMELINE_HEIGHT = 30
+TRACK_HEIGHT = 8
+PLAYHEAD_WIDTH = 9
+# minimal visible range when zooming in, ms
+MIN_VIEW_SPAN = 200
+ZOOM_WHEEL_FACTOR = 1.25
+
+MARKER_COLOR = QColor(42, 130, 218)
+ANCHOR_COLOR = QColor(230, 160, 40)
+RANGE_COLOR = QColor(42, 130, 218, 70)
+
+
+def choose_step(span: int, width: int, min_spacing: int) -> int:
+    """
+    Chooses the smallest step from TICK_STEPS, so that ticks are at least min_spacing pixels apart
+    :param span: visible range, ms
+    :param width: widget width, px
+    :param min_spacing: minimal distance between ticks, px
+    """
+    for step in TICK_STEPS:
+        if step * width >= min_spacing * span:
+            return step
+    return TICK_STEPS[-1] * max(1, -(-span * min_spacing // (width * TICK_STEPS[-1])))
+
+
+def format_label(time_ms: int, step: int) -> str:
+    mins = time_ms // 60000
+    s = (time_ms // 1000) % 60
+    if step < 1000:
+        return '%d:%02d.%03d' % (mins, s, time_ms % 1000)
+    return '%d:%02d' % (mins, s)
+
+
+class Timeline(QWidget):
+    """
+    Timeline with level of detail ticks and overlays for markers, anchors and ranges.
+    Static content is drawn once into cached pixmap, position updates repaint only the playhead.
+    Mouse wheel zooms the visible range.
+    """
+    valueChanged = Signal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+        self.setFocusPolicy(Qt.StrongFocus)
+        self._minimum = 0
+        self._maximum = 0
+        self._value = 0
+        self._single_step = 100
+        self._view: Tuple[int, int] = (0, 0)
+        self._markers: List[int] = []
+        self._anchors: List[int] = []
+        self._ranges: List[Tuple[int, int]] = []
+        self._background: Optional[QPixmap] = None
+
+    def sizeHint(self) -> QSize:
+        return QSize(200, TIMELINE_HEIGHT)
+
+    def minimumSizeHint(self) -> QSize:
+        return QSize(50, TIMELINE_HEIGHT)
+
+    # QSlider-like interface
+
+    def setRange(self, minimum: int, maximum: int):
+        self._minimum = minimum
+        self._maximum = max(minimum, maximum)
+        self._view = (self._minimum, self._maximum)
+        self.__invalidate()
+        self.setValue(self._value)
+
+    def minimum(self) -> int:
+        return self._minimum
+
+    def maximum(self) -> int:
+        return self._maximum
+
+    def value(self) -> int:
+        return self._value
+
+    def setSingleStep(self, step: int):
+        self._single_step = step
+
+    def setValue(self, value: int):
+        value = min(self._maximum, max(self._minimum, value))
+        if value == self._value:
+            return
+        old_x = self.__value_to_x(self._value)
+        self._value = value
+        if not self.__follow_value():
+            self.update(self.__playhead_rect(old_x))
+            self.update(self.__playhead_rect(self.__value_to_x(value)))
+        self.valueChanged.emit(value)
+
+    # overlays
+
+    def set_markers(self, markers: List[int]):
+        self._markers = list(markers)
+        self.__invalidate()
+
+    def set_anchors(self, anchors: List[int]):
+        self._anchors = list(anchors)
+        self.__invalidate()
+
+    def set_ranges(self, ranges: List[Tuple[int, int]]):
+        self._ranges = list(ranges)
+        self.__invalidate()
+
+    # geometry
+
+    def __value_to_x(self, value: int) -> int:
+        start, end = self._view
+        if end <= start:
+            return PLAYHEAD_WIDTH // 2
+        usable = self.width() - PLAYHEAD_WIDTH
+        return PLAYHEAD_WIDTH // 2 + round((value - start) * usable / (end - start))
+
+    def __x_to_value(self, x: float) -> int:
+        start, end = self._view
+        usable = max(1, self.width() - PLAYHEAD_WIDTH)
+        return round(start + (x - PLAYHEAD_WIDTH // 2) * (end - start) / usable)
+
+    def __playhead_rect(self, x: int) -> QRect:
+        return QRect(x - PLAYHEAD_WIDTH // 2 - 1, 0, PLAYHEAD_WIDTH + 2, self.height())
+
+    def __follow_value(self) -> bool:
+        """
+        Scrolls zoomed view to keep the value visible
+        :return: True if the view was changed
+        """
+        start, end = self._view
+        if start <= self._value <= end:
+            return False
+        span = end - start
+        start = min(self._maximum - span, max(self._minimum, self._value - span // 2))
+        self._view = (start, start + span)
+        self.__invalidate()
+        return True
+
+    def __invalidate(self):
+        self._background = None
+        self.update()
+
+    # painting
+
+    def __render_background(self) -> QPixmap:
+        # rendered in device pixels, so ticks and labels are sharp on high DPI screens
+        ratio = self.devicePixelRatioF()
+        pixmap = QPixmap(self.size() * ratio)
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.transparent)
+        painter = QPainter(pixmap)
+        palette = self.palette()
+        group = QPalette.Active if self.isEnabled() else QPalette.Disabled
+        track_top = self.height() - TRACK_HEIGHT - 2
+
+        track = QRect(PLAYHEAD_WIDTH // 2, track_top, self.width() - PLAYHEAD_WIDTH, TRACK_HEIGHT)
+        painter.fillRect(track, palette.color(group, QPalette.Base))
+
+        start, end = self._view
+        width = max(1, self.width() - PLAYHEAD_WIDTH)
+        if end > start:
+            for range_start, range_end in self._ranges:
+                x1 = self.__value_to_x(max(start, range_start))
+                x2 = self.__value_to_x(min(end, range_end))
+                if x2 > x1:
+                    painter.fillRect(QRect(x1, track_top, x2 - x1, TRACK_HEIGHT), RANGE_COLOR)
+
+            # ticks and labels, density depends on the visible span, not on the length of the video
+            step = choose_step(end - start, width, MIN_TICK_SPACING)
+            label_step = choose_step(end - start, width, MIN_LABEL_SPACING)
+            text_color = palette.color(group, QPalette.WindowText)
+            painter.setPen(text_color.darker(150))
+            first = -(-start // step) * step
+            for tick in range(first, end + 1, step):
+                x = self.__value_to_x(tick)
+                major = tick % (step * MAJOR_TICK_EVERY) == 0
+                painter.drawLine(x, track_top - (6 if major else 3), x, track_top - 1)
+            painter.setPen(text_color)
+            font = painter.font()
+            font.setPointSizeF(font.pointSizeF() * 0.8)
+            painter.setFont(font)
+            first = -(-start // label_step) * label_step
+            for tick in range(first, end + 1, label_step):
+                x = self.__value_to_x(tick)
+                painter.drawText(x + 2, track_top - 7, format_label(tick, label_step))
+
+            for color, values in [(MARKER_COLOR, self._markers), (ANCHOR_COLOR, self._anchors)]:
+                painter.setPen(color)
+                for value in values:
+                    if start <= value <= end:
+                        x = self.__value_to_x(value)
+                        painter.drawLine(x, track_top - 2, x, track_top + TRACK_HEIGHT)
+        painter.end()
+        return pixmap
+
+    def paintEvent(self, event):
+        ratio = self.devicePixelRatioF()
+        if self._background is None or self._background.devicePixelRatio() != ratio or \
+                self._background.deviceIndependentSize().toSize() != self.size():
+            self._background = self.__render_background()
+        painter = QPainter(self)
+        rect = event.rect()
+        # source rectangle is in pixels of the pixmap
+        source = QRectF(rect.x() * ratio, rect.y() * ratio, rect.width() * ratio, rect.height() * ratio)
+        painter.drawPixmap(QRectF(rect), self._background, source)
+
+        x = self.__value_to_x(self._value)
+        if event.rect().intersects(self.__playhead_rect(x)):
+            palette = self.palette()
+            group = QPalette.Active if self.isEnabled() else QPalette.Disabled
+            track_top = self.height() - TRACK_HEIGHT - 2
+            painter.fillRect(QRect(x - PLAYHEAD_WIDTH // 2, track_top - 3, PLAYHEAD_WIDTH, TRACK_HEIGHT + 5),
+                             palette.color(group, QPalette.Highlight))
+
+    def resizeEvent(self, event):
+        self._background = None
+        super().resizeEvent(event)
+
+    def changeEvent(self, event):
+        if event.type() in (QEvent.EnabledChange, QEvent.PaletteChange, QEvent.FontChange):
+            self.__invalidate()
+        super().changeEvent(event)
+
+    # input
+
+    def mousePressEvent(self, event: QMouseEvent):
+        if event.button() == Qt.LeftButton:
+            self.setValue(self.__x_to_value(event.position().x()))
+
+    def mouseMoveEvent(self, event: QMouseEvent):
+        if event.buttons() & Qt.LeftButton:
+            self.setValue(self.__x_to_value(event.position().x()))
+
+    def keyPressEvent(self, event: QKeyEvent):
+        if event.key() == Qt.Key_Left:
+            self.setValue(self._value - self._single_step)
+        elif event.key() == Qt.Key_Right:
+            self.setValue(self._value + self._single_step)
+        else:
+            super().keyPressEvent(event)
+
+    def wheelEvent(self, event: QWheelEvent):
+        start, end = self._view
+        if self._maximum <= self._minimum or event.angleDelta().y() == 0:
+            return
+        factor = 1 / ZOOM_WHEEL_FACTOR if event.angleDelta().y() > 0 else ZOOM_WHEEL_FACTOR
+        pivot = self.__x_to_value(event.position().x())
+        span = min(self._maximum - self._minimum, max(MIN_VIEW_SPAN, round((end - start) * factor)))
+        new_start = pivot - round((pivot - start) * span / max(1, end - start))
+        new_start = min(self._maximum - span, max(self._minimum, new_start))
+        self._view = (new_start, new_start + span)
+        self.__invalidate()
+        event.accept()
@@ -0,0 +1,133 @@
+# Sync Player
+# Copyright (C) 2023, Roman Arsenikhin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 65536
+
+PHASE_COMPLETE = 'X'
+PHASE_INSTANT = 'i'
+
+_NULL_SPAN = nullcontext()
+
+
+class _Span:
+    __slots__ = ('_tracer', '_name', '_fmt', '_args', '_start')
+
+    def __init__(self, tracer: 'Tracer', name: str, fmt, args):
+        self._tracer = tracer
+        self._name = name
+        self._fmt = fmt
+        self._args = args
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        self._tracer._record(PHASE_COMPLETE, self._name, self._start, end - self._start, self._fmt, self._args)
+        return False
+
+
+class Tracer:
+    """
+    Records timestamped spans and instant events into a preallocated ring buffer.
+    Messages are formatted only on export, so tracing costs almost nothing when it's off
+    and little when it's on.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.enabled = False
+        self._capacity = capacity
+        self._events = [None] * capacity
+        self._counter = itertools.count()
+        self._origin = time.perf_counter_ns()
+
+    def set_enabled(self, enabled: bool):
+        if enabled and not self.enabled:
+            self.clear()
+        self.enabled = enabled
+        logger.info('Tracing %s', 'enabled' if enabled else 'disabled')
+
+    def clear(self):
+        self._events = [None] * self._capacity
+        self._counter = itertools.count()
+
+    def span(self, name: str, fmt: str = None, *args):
+        """
+        Context manager measuring duration of the enclosed block
+        :param name: event name
+        :param fmt: optional message format, formatted with args on export
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, fmt, args)
+
+    def instant(self, name: str, fmt: str = None, *args):
+        """
+        Records an instant event
+        :param name: event name
+        :param fmt: optional message format, formatted with args on export
+        """
+        if not self.enabled:
+            return
+        self._record(PHASE_INSTANT, name, time.perf_counter_ns(), 0, fmt, args)
+
+    def _record(self, phase: str, name: str, start: int, duration: int, fmt, args):
+        # itertools.count is atomic, so concurrent writers get different slots
+        idx = next(self._counter)
+        self._events[idx % self._capacity] = (phase, name, start, duration, threading.get_ident(), fmt, args)
+
+    def export_chrome_trace(self, path: str) -> int:
+        """
+        Writes recorded events in Chrome trace event format, can be opened in chrome://tracing or Perfetto
+        :param path: output file
+        :return: number of exported events
+        """
+        pid = os.getpid()
+        thread_names = {t.ident: t.name for t in threading.enumerate()}
+        events = sorted((x for x in self._events if x is not None), key=lambda x: x[2])
+        trace = []
+        for tid in {x[4] for x in events}:
+            trace.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                          'args': {'name': thread_names.get(tid, str(tid))}})
+        for phase, name, start, duration, tid, fmt, args in events:
+            event = {'name': name, 'ph': phase, 'ts': (start - self._origin) / 1000.0, 'pid': pid, 'tid': tid}
+            if phase == PHASE_COMPLETE:
+                event['dur'] = duration / 1000.0
+            else:
+                event['s'] = 't'
+            if fmt is not None:
+                try:
+                    event['args'] = {'message': fmt % args if args else fmt}
+                except (TypeError, ValueError):
+                    event['args'] = {'message': '%s %r' % (fmt, args)}
+            trace.append(event)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+        logger.info('Exported %d trace events to %s', len(events), path)
+        return len(events)
+
+
+tracer = Tracer()
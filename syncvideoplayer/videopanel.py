@@ -13,24 +13,47 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import bisect
 import logging
+from typing import List, Optional
 
 from PySide6.QtCore import Qt, Signal, QMimeData
 from PySide6.QtGui import QDropEvent, QDragEnterEvent
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QSlider, QSizePolicy, QLineEdit, QPushButton
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QSizePolicy, QLineEdit, QPushButton
 
+from syncvideoplayer.sceneindex import SceneIndexer
+from syncvideoplayer.timeline import Timeline
 from syncvideoplayer.utils import ms_to_str
 from syncvideoplayer.videowidget import VideoWidget
 from syncvideoplayer.widgets import HLayoutWidget
 
 logger = logging.getLogger(__name__)
 
+# jumping to the previous event skips the event if it was just passed
+EVENT_JUMP_TOLERANCE = 500
 
-class OffsetSlider(QSlider):
+
+def find_event(events: List[int], time_ms: int, forward: bool) -> Optional[int]:
+    """
+    Finds next or previous event relative to the position
+    :param events: sorted list of events
+    :param time_ms: current position
+    :param forward: True to find next event, False to find previous one
+    :return: event time or None if there is no such event
+    """
+    if forward:
+        idx = bisect.bisect_right(events, time_ms)
+        return events[idx] if idx < len(events) else None
+    else:
+        idx = bisect.bisect_left(events, time_ms - EVENT_JUMP_TOLERANCE)
+        return events[idx - 1] if idx > 0 else None
+
+
+class OffsetSlider(Timeline):
     def __init__(self):
-        super().__init__(Qt.Orientation.Horizontal)
-        self.setTickInterval(1000)
-        self.setTickPosition(self.TickPosition.TicksAbove)
+        super().__init__()
+        # more or less one frame
+        self.setSingleStep(30)
 
 
 class ControlButton(QPushButton):
@@ -59,6 +82,7 @@ class OffsetDisplay(QLineEdit):
 
 class VideoPanelControl(HLayoutWidget):
     clicked_open_video = Signal()
+    collapse_toggled = Signal(bool)
     start_changed = Signal(int)
     offset_changed = Signal(int)
     seek = Signal(int)
@@ -71,6 +95,11 @@ class VideoPanelControl(HLayoutWidget):
         self._w_start_label = OffsetDisplay(False)
 
         self._w_button_open_video = ControlButton('⏏')
+        self._w_button_collapse = ControlButton('▾')
+        self._w_button_collapse.setCheckable(True)
+        self._w_button_collapse.setToolTip('Hide the video, its decoding is suspended while hidden')
+        self._w_button_prev_event = ControlButton('⏮')
+        self._w_button_next_event = ControlButton('⏭')
         self._w_button_dec_ofs_l = ControlButton('<<<')
         self._w_button_dec_ofs_m = ControlButton('<<')
         self._w_button_dec_ofs_s = ControlButton('<')
@@ -78,7 +107,10 @@ class VideoPanelControl(HLayoutWidget):
         self._w_button_inc_ofs_m = ControlButton('>>')
         self._w_button_inc_ofs_s = ControlButton('>')
 
+        self.add_widget(self._w_button_collapse)
         self.add_widget(self._w_button_open_video)
+        self.add_widget(self._w_button_prev_event)
+        self.add_widget(self._w_button_next_event)
 
         self.add_widget(self._w_button_dec_ofs_l)
         self.add_widget(self._w_button_dec_ofs_m)
@@ -90,6 +122,7 @@ class VideoPanelControl(HLayoutWidget):
         self.add_widget(self._w_start_label)
 
         self._w_button_open_video.clicked.connect(self.clicked_open_video)
+        self._w_button_collapse.toggled.connect(self.__on_collapse_toggled)
         self._w_start_editor.valueChanged.connect(self.seek)
 
         self._w_button_dec_ofs_l.clicked.connect(self.__fn_change_pos(-500))
@@ -98,15 +131,39 @@ class VideoPanelControl(HLayoutWidget):
         self._w_button_inc_ofs_l.clicked.connect(self.__fn_change_pos(500))
         self._w_button_inc_ofs_m.clicked.connect(self.__fn_change_pos(100))
         self._w_button_inc_ofs_s.clicked.connect(self.__fn_change_pos(30))
+        self._w_button_prev_event.clicked.connect(self.__fn_jump_to_event(False))
+        self._w_button_next_event.clicked.connect(self.__fn_jump_to_event(True))
+
+        self.set_events([])
 
     def __fn_change_pos(self, delta: int):
         def fn():
             self._w_start_editor.setValue(self._w_start_editor.value() + delta)
         return fn
 
+    def __on_collapse_toggled(self, collapsed: bool):
+        self._w_button_collapse.setText('▸' if collapsed else '▾')
+        self.collapse_toggled.emit(collapsed)
+
+    def __fn_jump_to_event(self, forward: bool):
+        def fn():
+            event = find_event(self._events, self._w_start_editor.value(), forward)
+            if event is not None:
+                self._w_start_editor.setValue(event)
+        return fn
+
+    def set_events(self, events: List[int]):
+        self._events = events
+        self._w_start_editor.set_markers(events)
+        self._w_button_prev_event.setEnabled(bool(events))
+        self._w_button_next_event.setEnabled(bool(events))
+
     def set_duration(self, time_ms: int):
         self._w_start_editor.setRange(0, time_ms)
 
+    def set_anchor(self, time_ms: Optional[int]):
+        self._w_start_editor.set_anchors([] if time_ms is None else [time_ms])
+
     def update_position(self, time_ms: int):
         self._w_start_editor.blockSignals(True)
         self._w_start_editor.setValue(time_ms)
@@ -121,6 +178,7 @@ class VideoPanel(QWidget):
     playback_toggled = Signal(bool)
     pos_changed = Signal(int)
     seek = Signal(int)
+    playback_restarted = Signal()
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -128,18 +186,25 @@ class VideoPanel(QWidget):
         self._layout = QVBoxLayout()
         self.setLayout(self._layout)
 
+        self._fname = None
+        self._events = []
+        self._indexer = SceneIndexer(self)
+
         self._w_video = VideoWidget()
         self._w_control = VideoPanelControl()
         self._layout.addWidget(self._w_video)
         self._layout.addWidget(self._w_control)
 
         self._w_control.clicked_open_video.connect(self.clicked_open_video)
+        self._w_control.collapse_toggled.connect(self.__on_collapse_toggled)
         self._w_control.seek.connect(self.seek)
         self._w_control.seek.connect(self.__on_seek)
         self._w_video.duration.connect(self.duration)
         self._w_video.duration.connect(self.__on_duration_known)
         self._w_video.playback_toggled.connect(self.playback_toggled)
         self._w_video.pos_changed.connect(self.pos_changed)
+        self._w_video.playback_restarted.connect(self.playback_restarted)
+        self._indexer.ready.connect(self.__on_events_ready)
 
         self.setAcceptDrops(True)
 
@@ -156,16 +221,59 @@ class VideoPanel(QWidget):
             event.acceptProposedAction()
 
     def dropEvent(self, event: QDropEvent):
-        logger.debug('Drop event: %s' % str(event))
+        logger.debug('Drop event: %s', event)
         files = self.__files_list_from_mimedata(event.mimeData())
         if len(files) == 1:
             self.file_dropped.emit(files[0])
 
+    def __on_collapse_toggled(self, collapsed: bool):
+        # hidden video widget suspends decoding by itself
+        self._w_video.setVisible(not collapsed)
+        if collapsed:
+            self.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Maximum)
+        else:
+            self.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Preferred)
+
+    def set_window_minimized(self, minimized: bool):
+        self._w_video.set_window_minimized(minimized)
+
+    def terminate(self):
+        """
+        Stops analysis and terminates the players of the panel
+        """
+        self._indexer.cancel()
+        self._w_video.terminate()
+
     def __on_duration_known(self, duration):
         self._w_control.set_duration(duration)
 
-    def set_video(self, fname: str):
-        self._w_video.set_video(fname)
+    def __on_events_ready(self, fname: str, events: list):
+        if fname != self._fname:
+            return
+        self._events = events
+        self._w_control.set_events(events)
+
+    def set_video(self, fname: str, time_ms: int = 0):
+        self._fname = fname
+        self._events = []
+        self._w_control.set_events([])
+        self._w_video.set_video(fname, time_ms)
+        self._indexer.analyze(fname)
+
+    def preload(self, fname: str, time_ms: int = 0):
+        """
+        Prepares the video to be opened instantly by set_video
+        """
+        self._w_video.preload(fname, time_ms)
+
+    def get_video_path(self) -> Optional[str]:
+        return self._fname
+
+    def get_events(self) -> List[int]:
+        """
+        :return: sorted list of detected events (scene cuts and motion peaks) of the video
+        """
+        return self._events
 
     def stop_playback(self):
         self._w_video.stop_playback()
@@ -176,6 +284,12 @@ class VideoPanel(QWidget):
     def get_duration(self) -> int:
         return self._w_video.get_duration()
 
+    def get_position(self) -> Optional[int]:
+        return self._w_video.get_position()
+
+    def get_frame_duration(self) -> Optional[float]:
+        return self._w_video.get_frame_duration()
+
     def set_controls_enabled(self, enabled: bool):
         self._w_control.setEnabled(enabled)
 
@@ -188,6 +302,13 @@ class VideoPanel(QWidget):
     def update_position(self, time_ms: int):
         self._w_control.update_position(time_ms)
 
+    def set_anchor(self, time_ms: Optional[int]):
+        """
+        Shows anchor on the seek control
+        :param time_ms: anchor position or None to remove anchor
+        """
+        self._w_control.set_anchor(time_ms)
+
     def has_video(self):
         return self._w_video.has_video()
 
@@ -199,3 +320,9 @@ class VideoPanel(QWidget):
 
     def set_speed(self, *args, **kwargs):
         self._w_video.set_speed(*args, **kwargs)
+
+    def set_scan_mode(self, *args, **kwargs):
+        self._w_video.set_scan_mode(*args, **kwargs)
+
+    def set_zoom(self, *args, **kwargs):
+        self._w_video.set_zoom(*args, **kwargs)
@@ -14,93 +14,464 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+import threading
+import time
+from typing import Optional
 
-from PySide6.QtCore import Qt, Signal
-from PySide6.QtWidgets import QWidget, QSizePolicy, QVBoxLayout
+from PySide6.QtCore import Qt, Signal, QTimer
+from PySide6.QtWidgets import QWidget, QSizePolicy, QStackedLayout
+
+from syncvideoplayer.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
+MPV_LOG_LEVELS = {
+    'fatal': logging.CRITICAL,
+    'error': logging.ERROR,
+    'warn': logging.WARNING,
+    'info': logging.INFO,
+}
+
+# decoder settings used while scanning at high speed: only key frames are decoded,
+# everything the decoder or VO can't keep up with is dropped
+SCAN_DECODER_SETTINGS = {
+    'vd-lavc-skipframe': 'nonkey',
+    'vd-lavc-skiploopfilter': 'all',
+    'framedrop': 'decoder+vo',
+}
+# mpv defaults, restored when scan mode ends
+NORMAL_DECODER_SETTINGS = {
+    'vd-lavc-skipframe': 'default',
+    'vd-lavc-skiploopfilter': 'default',
+    'framedrop': 'vo',
+}
+
+# label of the filter used for region of interest zoom
+ZOOM_FILTER_LABEL = '@roi'
+
+# how often position is reported while decoding is suspended, ms
+SUSPENDED_POSITION_INTERVAL = 100
+
+
+def _on_mpv_log(level, component, message):
+    tracer.instant('mpv-log', '[%s] %s: %s', level, component, message)
+    logger.log(MPV_LOG_LEVELS.get(level, logging.DEBUG), '[mpv/%s] %s', component, message.rstrip())
+
+
+# when enabled, each player runs in a separate process
+_use_player_processes = False
+
+
+def use_player_processes(enabled: bool):
+    """
+    Switches creation of new players between this process and separate player processes
+    """
+    global _use_player_processes
+    _use_player_processes = enabled
+
+
+def _create_player():
+    init_args = {
+        'loglevel': 'warn',
+        'audio': False,
+        'merge_files': True,
+        'config': False,
+        'input_default_bindings': False,
+        'start_event_thread': True,
+        'keep-open': True,
+    }
+    if _use_player_processes:
+        from syncvideoplayer.playerprocess import RemotePlayer
+        player = RemotePlayer(init_args)
+    else:
+        from mpv import MPV
+        player = MPV(log_handler=_on_mpv_log, **init_args)
+    player['pause'] = True
+    return player
+
+
+class PlayerPool:
+    """
+    Creates players in background, so loading libmpv and creating players doesn't block GUI thread.
+    Players are created without window, window is attached when the player is taken from the pool.
+    """
+
+    def __init__(self):
+        self._players = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def prewarm(self, count: int):
+        """
+        Starts creation of players in background
+        :param count: number of players to create
+        """
+        self._thread = threading.Thread(target=self.__create_players, args=(count,), name='player-prewarm',
+                                        daemon=True)
+        self._thread.start()
+
+    def __create_players(self, count: int):
+        try:
+            for _ in range(count):
+                player = _create_player()
+                with self._lock:
+                    self._players.append(player)
+        except Exception:
+            logger.exception('Failed to prewarm players')
+
+    def take(self):
+        """
+        Takes prewarmed player, waiting for the prewarm in progress
+        :return: player or None if there is no prewarmed players
+        """
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+        with self._lock:
+            return self._players.pop(0) if self._players else None
+
+    def terminate(self):
+        """
+        Terminates prewarmed players which were not taken
+        """
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+        with self._lock:
+            players, self._players = self._players, []
+        for player in players:
+            player.terminate()
+
+
+player_pool = PlayerPool()
+
+
 class VideoWidget(QWidget):
     duration = Signal(int)
     playback_toggled = Signal(bool)
     pos_changed = Signal(int)
+    # emitted when a frame is shown after loading or seeking
+    playback_restarted = Signal()
 
     def __init__(self, parent=None):
         super().__init__(parent)
 
         self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
 
-        self._layout = QVBoxLayout()
+        # the second panel hosts standby player, which preloads the next video
+        self._layout = QStackedLayout()
         self._layout.setSpacing(0)
         self._layout.setContentsMargins(0, 0, 0, 0)
         self.setLayout(self._layout)
         self.setStyleSheet("background-color:#222;")
 
-        self._w_panel = QWidget()
-        self._w_panel.setAttribute(Qt.WA_DontCreateNativeAncestors)
-        self._w_panel.setAttribute(Qt.WA_NativeWindow)
+        self._w_panel = self.__make_panel()
+        self._w_standby_panel = self.__make_panel()
         self._layout.addWidget(self._w_panel)
+        self._layout.addWidget(self._w_standby_panel)
+        self._layout.setCurrentWidget(self._w_panel)
 
         self._player = None
+        self._standby = None
+        self._standby_fname: Optional[str] = None
+        self._standby_time = 0
+        self._standby_duration: Optional[int] = None
         self._has_video = False
+        # scan speed is selected; key frames only decoding is used only while playing at it
+        self._scan_mode = False
+        self._scan_decoding = False
+        self._playing = False
+        self._zoom = (1.0, 0.5, 0.5)
+        self._speed = 1.0
 
-    def set_video(self, fname: str):
-        if self._player is None:
-            self._init_player()
+        # last reported state of the active player
+        self._position = 0
+        self._duration: Optional[int] = None
+        # while the widget is not visible, player is paused and playback is simulated by the clock
+        self._window_minimized = False
+        self._suspended = False
+        self._suspended_playing = False
+        self._suspended_position = 0
+        self._suspended_since = 0.0
+        # last pause value set by the widget and whether it was set internally on suspend or resume.
+        # Changes made internally are not reported as playback toggles. The tuple is replaced as a whole,
+        # because pause events are handled on player thread.
+        self._pause_request = (True, True)
+        self._suspended_timer = QTimer(self)
+        self._suspended_timer.setInterval(SUSPENDED_POSITION_INTERVAL)
+        self._suspended_timer.timeout.connect(self.__on_suspended_tick)
+
+    @staticmethod
+    def __make_panel() -> QWidget:
+        panel = QWidget()
+        panel.setAttribute(Qt.WA_DontCreateNativeAncestors)
+        panel.setAttribute(Qt.WA_NativeWindow)
+        return panel
+
+    def __players(self):
+        return [x for x in [self._player, self._standby] if x is not None]
 
-        self._player.play(fname)
+    def terminate(self):
+        """
+        Terminates the players, the widget can't play videos after that
+        """
+        self._suspended_timer.stop()
+        for player in self.__players():
+            player.terminate()
+        self._player = None
+        self._standby = None
+        self._standby_fname = None
+
+    def set_video(self, fname: str, time_ms: int = 0):
+        """
+        Opens the video. If the video was preloaded, the preloaded player is shown instead.
+        :param fname: video file
+        :param time_ms: initial position
+        """
+        if self._standby is not None and self._standby_fname == fname:
+            self.__swap_to_standby(time_ms)
+        else:
+            if self._player is None:
+                self._player = self._init_player(self._w_panel)
+            self._player.loadfile(fname, start='%.3f' % (time_ms / 1000.0))
         self._has_video = True
+        self._position = time_ms
+        if self._suspended:
+            self._suspended_playing = False
+            self._suspended_position = time_ms
+        self.__update_suspension()
 
-    def _init_player(self):
-        from mpv import MPV
+    def preload(self, fname: str, time_ms: int = 0):
+        """
+        Opens the video in standby player, so it can be shown instantly by set_video
+        :param fname: video file
+        :param time_ms: initial position
+        """
+        if self._standby is None:
+            self._standby = self._init_player(self._w_standby_panel)
+        logger.debug('Preloading %s at %d', fname, time_ms)
+        self._standby_fname = fname
+        self._standby_time = time_ms
+        self._standby_duration = None
+        self._standby['pause'] = True
+        self._standby.loadfile(fname, start='%.3f' % (time_ms / 1000.0))
+
+    def __swap_to_standby(self, time_ms: int):
+        logger.debug('Showing preloaded %s', self._standby_fname)
+        self._player, self._standby = self._standby, self._player
+        self._w_panel, self._w_standby_panel = self._w_standby_panel, self._w_panel
+        self._layout.setCurrentWidget(self._w_panel)
+        self._standby_fname = None
+        if self._scan_decoding:
+            # replaced player is used for preloading, which must use full decoding
+            self._scan_decoding = False
+            self.__apply_decoder_settings(self._standby, False)
+        if self._standby is not None:
+            self._standby['pause'] = True
+        # preloaded player is paused
+        self._pause_request = (True, True)
+        if time_ms != self._standby_time:
+            self.seek(time_ms)
+        self._position = time_ms
+        self.pos_changed.emit(time_ms)
+        if self._standby_duration is not None:
+            self._duration = self._standby_duration
+            self.duration.emit(self._standby_duration)
 
-        init_args = {
-            'loglevel': 'warn',
-            'audio': False,
-            'merge_files': True,
-            'config': False,
-            'input_default_bindings': False,
-            'start_event_thread': True,
-            'log_handler': print,
-            'keep-open': True,
-        }
-        logger.info('Creating new MPV player on window_id=%d' % int(self._w_panel.winId()))
-        self._player = MPV(wid=str(int(self._w_panel.winId())), **init_args)
-        self._player['pause'] = True
-
-        self._player.observe_property('pause', self.__on_play_pause)
-        self._player.observe_property('time-pos', self.__on_time_changed)
-        self._player.observe_property('duration', self.__on_duration_known)
+    def _init_player(self, panel: QWidget):
+        wid = int(panel.winId())
+        player = player_pool.take()
+        if player is None:
+            logger.info('Creating new MPV player on window_id=%d', wid)
+            player = _create_player()
+        else:
+            logger.info('Using prewarmed MPV player on window_id=%d', wid)
+        # VO is not created yet, so the window can be set after player creation
+        player['wid'] = str(wid)
+        player['speed'] = self._speed
+        self.__apply_decoder_settings(player, False)
+        if self._zoom[0] > 1.0:
+            self.__apply_zoom(player)
+
+        # callbacks are shared by active and standby players, events of standby player are not emitted
+        player.observe_property('pause', self.__fn_if_active(player, self.__on_play_pause))
+        player.observe_property('time-pos', self.__fn_if_active(player, self.__on_time_changed))
+        player.observe_property('duration', self.__fn_duration_known(player))
+        player.event_callback('playback-restart')(self.__fn_if_active(player, self.__on_playback_restart))
+        return player
+
+    def __fn_if_active(self, player, callback):
+        def fn(*args):
+            if player is self._player:
+                callback(*args)
+        return fn
 
     def stop_playback(self):
-        if self._player is not None:
+        self._playing = False
+        # the following seeks must land on exact frames
+        self.__update_scan_decoding()
+        if self._suspended:
+            self.__set_suspended_playing(False)
+        elif self._player is not None:
+            self._pause_request = (True, False)
             self._player['pause'] = True
 
     def start_playback(self):
-        if self._player is not None:
+        self._playing = True
+        self.__update_scan_decoding()
+        if self._suspended:
+            self.__set_suspended_playing(True)
+        elif self._player is not None:
+            self._pause_request = (False, False)
+            self._player['pause'] = False
+
+    def set_window_minimized(self, minimized: bool):
+        self._window_minimized = minimized
+        self.__update_suspension()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.__update_suspension()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.__update_suspension()
+
+    def __update_suspension(self):
+        """
+        Suspends decoding when the video can't be seen, resumes it when the video is shown again
+        """
+        should_suspend = self._player is not None and self._has_video and \
+            (not self.isVisible() or self._window_minimized)
+        if should_suspend and not self._suspended:
+            self.__suspend()
+        elif not should_suspend and self._suspended:
+            self.__resume()
+
+    def __suspend(self):
+        playing = not self._player['pause']
+        logger.debug('Suspending decoding at %d, playing=%s', self._position, playing)
+        self._suspended_position = self._position
+        self._suspended_since = time.perf_counter()
+        self._suspended_playing = playing
+        self._suspended = True
+        if playing:
+            self._pause_request = (True, True)
+            self._player['pause'] = True
+            self._suspended_timer.start()
+
+    def __resume(self):
+        position = self.__get_suspended_position()
+        logger.debug('Resuming decoding at %d, playing=%s', position, self._suspended_playing)
+        self._suspended_timer.stop()
+        self._player.seek(position / 1000.0, reference="absolute", precision="exact")
+        self._suspended = False
+        if self._suspended_playing:
+            self._pause_request = (False, True)
             self._player['pause'] = False
 
+    def __get_suspended_position(self) -> int:
+        position = self._suspended_position
+        if self._suspended_playing:
+            position += int((time.perf_counter() - self._suspended_since) * 1000 * self._speed)
+        if self._duration is not None:
+            position = min(position, self._duration)
+        return position
+
+    def __set_suspended_playing(self, playing: bool):
+        if playing == self._suspended_playing:
+            return
+        self._suspended_position = self.__get_suspended_position()
+        self._suspended_since = time.perf_counter()
+        self._suspended_playing = playing
+        if playing:
+            self._suspended_timer.start()
+        else:
+            self._suspended_timer.stop()
+        self.playback_toggled.emit(playing)
+
+    def __on_suspended_tick(self):
+        position = self.__get_suspended_position()
+        self._position = position
+        self.pos_changed.emit(position)
+        # player pauses at the end of the video, since it's opened with keep-open
+        if self._duration is not None and position >= self._duration:
+            self.__set_suspended_playing(False)
+
     def get_duration(self) -> int:
         if self._player is not None:
             return int(self._player['duration'] * 1000)
 
+    def get_position(self) -> Optional[int]:
+        """
+        :return: current position read from the player, not the last reported one
+        """
+        if self._suspended:
+            return self.__get_suspended_position()
+        if self._player is None:
+            return None
+        value = self._player['time-pos']
+        return None if value is None else int(round(float(value) * 1000))
+
+    def get_frame_duration(self) -> Optional[float]:
+        """
+        :return: duration of one frame, ms, or None if frame rate is unknown
+        """
+        if self._player is None:
+            return None
+        fps = self._player['container-fps'] or self._player['estimated-vf-fps']
+        return 1000.0 / fps if fps else None
+
+    def __on_playback_restart(self, event):
+        tracer.instant('playback-restart')
+        self.playback_restarted.emit()
+
     def __on_play_pause(self, name, value):
-        self.playback_toggled.emit(not bool(value))
+        tracer.instant('pause', '%s', value)
+        paused = bool(value)
+        requested, internal = self._pause_request
+        if paused == requested:
+            # pause state is changed internally when decoding is suspended or resumed
+            if internal:
+                return
+        elif bool(self._player['pause']) != paused:
+            # superseded by a later request, its own event follows
+            return
+        # otherwise the player paused by itself, e.g. at the end of the video
+        self.playback_toggled.emit(not paused)
 
     def __on_time_changed(self, name, value):
-        if value:
-            self.pos_changed.emit(int(float(value) * 1000))
+        tracer.instant('time-pos', '%s', value)
+        if value and not self._suspended:
+            self._position = int(float(value) * 1000)
+            self.pos_changed.emit(self._position)
 
-    def __on_duration_known(self, name, value):
-        try:
-            duration = int(float(value) * 1000)
-            self.duration.emit(duration)
-        except Exception:
-            ...
+    def __fn_duration_known(self, player):
+        def fn(name, value):
+            tracer.instant('duration', '%s', value)
+            try:
+                duration = int(float(value) * 1000)
+            except (TypeError, ValueError):
+                return
+            if player is self._player:
+                self._duration = duration
+                self.duration.emit(duration)
+            else:
+                self._standby_duration = duration
+        return fn
 
     def seek(self, time_ms: int):
+        if self._suspended:
+            # the player is positioned when decoding is resumed
+            self._suspended_position = time_ms
+            self._suspended_since = time.perf_counter()
+            self._position = time_ms
+            self.pos_changed.emit(time_ms)
+            self.playback_restarted.emit()
+            return
         if self._player is not None:
-            self._player.seek(float(time_ms) / 1000.0, reference="absolute", precision="exact")
+            with tracer.span('seek', '%d', time_ms):
+                self._player.seek(float(time_ms) / 1000.0, reference="absolute", precision="exact")
 
     def has_video(self) -> bool:
         return self._has_video
@@ -108,16 +479,72 @@ class VideoWidget(QWidget):
     def set_text_osd(self, id: int, text: str):
         if self._player is None:
             return
-        self._player.command('osd_overlay', id=id, data=text, res_x=1920, res_y=1080, z=0,
-                             hidden=False, format='ass-events')
+        with tracer.span('osd', '%d: %s', id, text):
+            self._player.command('osd_overlay', id=id, data=text, res_x=1920, res_y=1080, z=0,
+                                 hidden=False, format='ass-events')
 
     def clear_text_osd(self, id: int):
         if self._player is None:
             return
-        self._player.command('osd_overlay', id=id, data=None, res_x=1920, res_y=1080, z=0,
-                             hidden=False, format='none')
+        with tracer.span('osd-clear', '%d', id):
+            self._player.command('osd_overlay', id=id, data=None, res_x=1920, res_y=1080, z=0,
+                                 hidden=False, format='none')
 
     def set_speed(self, speed: float):
-        if self._player is None:
+        self._speed = speed
+        for player in self.__players():
+            player['speed'] = speed
+
+    def set_scan_mode(self, enabled: bool):
+        """
+        Switches decoder between full decoding and key frames only decoding during playback.
+        Full decoding is always used while the video is stopped, so seeks land on exact frames.
+        :param enabled: True to decode key frames only
+        """
+        self._scan_mode = enabled
+        self.__update_scan_decoding()
+
+    def __update_scan_decoding(self):
+        enabled = self._scan_mode and self._playing
+        if enabled == self._scan_decoding or self._player is None:
+            return
+        logger.debug('Switching to %s decoding', 'key frames only' if enabled else 'full')
+        self._scan_decoding = enabled
+        self.__apply_decoder_settings(self._player, enabled)
+        if self._has_video:
+            # decoder options are read when the decoder is created, so the decoder is recreated
+            try:
+                self._player.command('video-reload')
+            except Exception as e:
+                logger.warning('Failed to reload video decoder: %s', e)
+
+    @staticmethod
+    def __apply_decoder_settings(player, scan: bool):
+        settings = SCAN_DECODER_SETTINGS if scan else NORMAL_DECODER_SETTINGS
+        for name, value in settings.items():
+            player[name] = value
+
+    def set_zoom(self, zoom: float, pan_x: float, pan_y: float):
+        """
+        Shows a region of the video. The region is cropped by a filter before scaling,
+        so only the region is uploaded and scaled by VO.
+        :param zoom: zoom factor, 1.0 shows the whole frame
+        :param pan_x: horizontal position of the region, 0.0 - left edge, 1.0 - right edge
+        :param pan_y: vertical position of the region, 0.0 - top edge, 1.0 - bottom edge
+        """
+        self._zoom = (zoom, pan_x, pan_y)
+        for player in self.__players():
+            self.__apply_zoom(player)
+
+    def __apply_zoom(self, player):
+        zoom, pan_x, pan_y = self._zoom
+        if zoom <= 1.0:
+            try:
+                player.command('vf', 'remove', ZOOM_FILTER_LABEL)
+            except Exception:
+                # filter is not present
+                ...
             return
-        self._player['speed'] = speed
+        # expressions are evaluated against each video own size
+        player.command('vf', 'add', '%s:lavfi-crop=w=iw/%.4f:h=ih/%.4f:x=(iw-ow)*%.4f:y=(ih-oh)*%.4f' %
+                       (ZOOM_FILTER_LABEL, zoom, zoom, pan_x, pan_y))